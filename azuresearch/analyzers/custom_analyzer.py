@@ -37,11 +37,8 @@ class CustomAnalyzer(AbstractAnalyzer):
         }
         # add additional user generated params
         return_dict.update(self.params)
-        # make all params camelCase (to be sent correctly to Azure Search
-        return_dict = self.to_camel_case_dict(return_dict)
-
-        # Remove None values
-        return_dict = self.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = self.to_api_dict(return_dict)
         return return_dict
 
     # pylint: disable=arguments-differ
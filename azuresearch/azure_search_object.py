@@ -3,9 +3,39 @@
 import json
 import re
 from abc import ABC, abstractmethod
+from functools import lru_cache
 
 REGEX = re.compile('((?<=[a-z0-9])[A-Z]|(?!^)[A-Z](?=[a-z]))')
 
+# whether values of a type have a length, so emptiness is one dict lookup per value
+_SIZED_TYPES = {}
+
+
+@lru_cache(maxsize=4096)
+def snake_case(camel_case_string):
+    """ camelCase -> snake_case, memoized as the same keys are converted over and over
+    """
+    return REGEX.sub(r'_\1', camel_case_string).lower()
+
+
+@lru_cache(maxsize=4096)
+def camel_case(snake_case_string):
+    """ snake_case -> camelCase, memoized as the same keys are converted over and over
+    """
+    components = snake_case_string.split('_')
+    return components[0] + ''.join(c.title() for c in components[1:])
+
+
+def is_empty(value):
+    """ True for None and for values with a length of 0 (empty strings, lists, dicts...)
+    """
+    if value is None:
+        return True
+    sized = _SIZED_TYPES.get(type(value))
+    if sized is None:
+        sized = _SIZED_TYPES[type(value)] = hasattr(value, '__len__')
+    return sized and not len(value)
+
 
 class AzureSearchObject(ABC):
     """ AzureSearchObject
@@ -48,30 +78,26 @@ class AzureSearchObject(ABC):
         Removes all None values and empty lists from dic
         : return: new dict
         """
-        dic = {k: v for k, v in dic.items() if
-               (v is not None) and (not hasattr(v, '__len__') or
-                                    (hasattr(v, '__len__') and len(v) > 0))}
-        return dic
+        return {k: v for k, v in dic.items() if not is_empty(v)}
 
     @classmethod
     def to_snake_case(cls, camel_case_string):
         """ to_snake_case
         """
-        return REGEX.sub(r'_\1', camel_case_string).lower()
+        return snake_case(camel_case_string)
 
     @classmethod
     def to_camel_case(cls, snake_case_string):
         """ to_camel_case
         """
-        components = snake_case_string.split('_')
-        return components[0] + ''.join(c.title() for c in components[1:])
+        return camel_case(snake_case_string)
 
     @classmethod
     def to_snake_case_dict(cls, dic):
         """ to_snake_case_dict
         """
         if dic:
-            dic = {cls.to_snake_case(k): v for k, v in dic.items()}
+            dic = {snake_case(k): v for k, v in dic.items()}
         return dic
 
     @classmethod
@@ -79,5 +105,14 @@ class AzureSearchObject(ABC):
         """ to_camel_case_dict
         """
         if dic:
-            dic = {cls.to_camel_case(k): v for k, v in dic.items()}
+            dic = {camel_case(k): v for k, v in dic.items()}
         return dic
+
+    @classmethod
+    def to_api_dict(cls, dic):
+        """
+        to_camel_case_dict and remove_empty_values in a single pass:
+        the form of a to_dict sent to Azure Search
+        : return: new dict
+        """
+        return {camel_case(k): v for k, v in dic.items() if not is_empty(v)}
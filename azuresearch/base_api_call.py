@@ -5,8 +5,9 @@ import logging
 
 import requests
 
+from azuresearch import schema
 from azuresearch.azure_search_object import AzureSearchObject
-from azuresearch.service import Endpoint
+from azuresearch.service import Endpoint, AsyncEndpoint
 
 
 class AzureSearchServiceException(Exception):
@@ -25,45 +26,212 @@ class BaseApiCall(AzureSearchObject):
     """
     Abstract class for wrapping common calls to Azure Search services
     """
+    # DefinitionCache used by get, list and fetch unless set per instance,
+    # e.g. BaseApiCall.definition_cache = DefinitionCache("/var/cache/azuresearch")
+    definition_cache = None
 
-    def __init__(self, service_name, endpoint=None, **kwargs):
+    # pylint: disable=too-many-arguments
+    def __init__(self, service_name, endpoint=None, async_endpoint=None,
+                 definition_cache=None, client=None, **kwargs):
         """
         :param service_name: Name of Azure Search service (e.g. indexes, datasources, skillsets)
         :param endpoint:
+        :param async_endpoint: AsyncEndpoint used by the async (a-prefixed) methods.
+                               Created lazily if not provided
+        :param definition_cache: DefinitionCache revalidating definitions by ETag.
+                                 Defaults to the class wide BaseApiCall.definition_cache
+        :param client: SearchServiceClient of the service to talk to. Defaults to the
+                       service configured in the environment
         """
         super().__init__(**kwargs)
+        if definition_cache is not None:
+            self.definition_cache = definition_cache
         self.service_name = service_name
+        self.client = client
         if endpoint:
             self.endpoint = endpoint
+        elif client is not None:
+            self.endpoint = client.endpoint(service_name)
         else:
             self.endpoint = Endpoint(service_name)
+        self._async_endpoint = async_endpoint
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    @property
+    def async_endpoint(self):
+        """ async_endpoint
+        """
+        if self._async_endpoint is None:
+            if self.client is not None:
+                self._async_endpoint = self.client.async_endpoint(self.service_name)
+            else:
+                self._async_endpoint = AsyncEndpoint(self.service_name)
+        return self._async_endpoint
+
+    def bind(self, client):
+        """
+        Binds the object to a SearchServiceClient: later calls go to its service
+        :return: self
+        """
+        self.client = client
+        self.endpoint = client.endpoint(self.service_name)
+        self._async_endpoint = None
+        return self
+
+    def close(self):
+        """ close the endpoint's session
+        """
+        self.endpoint.close()
+
+    async def aclose(self):
+        """ close the async endpoint's session
+        """
+        if self._async_endpoint is not None:
+            await self._async_endpoint.close()
 
     def to_dict(self):
         pass
 
-    def create(self):
-        """ create
-        """
-        result = self.endpoint.post(self.to_dict(), needs_admin=True)
+    def _handle_create(self, result):
         # pylint: disable=maybe-no-member
         if result.status_code != requests.codes.created:
-            raise Exception(
+            raise AzureSearchServiceException(
                 "Error posting {service_name}. result: {result}"
-                .format(service_name=self.service_name, result=json.load(result.content)))
+                .format(service_name=self.service_name, result=result.content))
         logging.debug("Successfully created service %s", self.service_name)
         return result
 
-    def get(self):
-        """ get
+    def _handle_delete(self, result):
+        if self.definition_cache is not None:
+            self.definition_cache.invalidate(self.endpoint.query_path(self.name))
+        # pylint: disable=maybe-no-member
+        if result.status_code == requests.codes.not_found:
+            raise ServiceDoesNotExistException(
+                "Error deleting {service_name}. result: {result}"
+                .format(service_name=self.service_name, result=result.content))
+
+        if result.status_code != requests.codes.no_content:
+            raise ServiceDoesNotExistException(
+                "Error deleting {service_name}. result: {result}"
+                .format(service_name=self.service_name, result=result.content))
+
+    @classmethod
+    def _handle_list(cls, service_name, result):
+        # pylint: disable=maybe-no-member
+        if result.status_code != requests.codes.ok:
+            raise AzureSearchServiceException(
+                "Error getting {service}. Result: {result}"
+                .format(service=service_name, result=result))
+
+        sources = json.loads(result.content)['value']
+
+        insts = []
+        for source in sources:
+            inst = cls.load(source)
+            insts.append(inst)
+        return insts
+
+    def create(self):
+        """ create
+        """
+        return self._handle_create(self.endpoint.post(self.to_dict(), needs_admin=True))
+
+    async def acreate(self):
+        """ create, asynchronously
+        """
+        return self._handle_create(
+            await self.async_endpoint.post(self.to_dict(), needs_admin=True))
+
+    @classmethod
+    def _definition_request(cls, endpoint, name, cache):
+        """
+        :return: (url, cached (etag, content) or None, conditional request headers)
+        """
+        url = endpoint.query_path(name)
+        cached = cache.get(url) if cache is not None else None
+        headers = {"If-None-Match": cached[0]} if cached else None
+        return url, cached, headers
+
+    @classmethod
+    def _handle_definition(cls, result, url, cache, cached, missing_ok=False):
+        """
+        :return: the definition (JSON bytes), reusing the cached one on 304 Not Modified.
+                 None if missing_ok and the resource does not exist
         """
         # pylint: disable=maybe-no-member
-        result = self.endpoint.get(endpoint=self.name, needs_admin=True)
+        if result.status_code == requests.codes.not_modified and cached:
+            cache.record(revalidated=True)
+            return cached[1]
+        if result.status_code == requests.codes.not_found and missing_ok:
+            return None
         if result.status_code != requests.codes.ok:
             raise AzureSearchServiceException(
                 "Error getting {service_name}. result: {result}"
-                .format(service_name=self.service_name, result=result.content))
+                .format(service_name=cls.SERVICE_NAME, result=result.content))
+        if cache is not None:
+            cache.record(revalidated=False)
+            etag = result.headers.get("ETag") or json.loads(result.content).get("@odata.etag")
+            cache.put(url, etag, result.content)
         return result.content
 
+    def get(self):
+        """ get
+        """
+        url, cached, headers = self._definition_request(self.endpoint, self.name,
+                                                        self.definition_cache)
+        return self._handle_definition(
+            self.endpoint.get(endpoint=self.name, needs_admin=True, headers=headers),
+            url, self.definition_cache, cached)
+
+    async def aget(self):
+        """ get, asynchronously
+        """
+        url, cached, headers = self._definition_request(self.endpoint, self.name,
+                                                        self.definition_cache)
+        return self._handle_definition(
+            await self.async_endpoint.get(endpoint=self.name, needs_admin=True,
+                                          headers=headers),
+            url, self.definition_cache, cached)
+
+    @classmethod
+    def _class_endpoint(cls, client):
+        if client is not None:
+            return client.endpoint(cls.SERVICE_NAME)
+        return Endpoint(cls.SERVICE_NAME)
+
+    @classmethod
+    def fetch(cls, name, endpoint=None, client=None):
+        """
+        Loads the definition of an existing resource from the service,
+        revalidating a cached copy when BaseApiCall.definition_cache is set
+        :param name: name of the resource
+        :param endpoint: Endpoint to use, defaults to one for the class's service
+        :param client: SearchServiceClient the loaded object is bound to
+        :return: instance of cls
+        """
+        if endpoint is None:
+            endpoint = cls._class_endpoint(client)
+        cache = cls.definition_cache
+        url, cached, headers = cls._definition_request(endpoint, name, cache)
+        content = cls._handle_definition(
+            endpoint.get(endpoint=name, needs_admin=True, headers=headers),
+            url, cache, cached)
+        inst = cls.load(json.loads(content))
+        if client is not None:
+            inst.bind(client)
+        return inst
+
     def delete_if_exists(self):
         """ delete if already exists
         """
@@ -72,52 +240,192 @@ class BaseApiCall(AzureSearchObject):
         except ServiceDoesNotExistException:
             pass
 
+    async def adelete_if_exists(self):
+        """ delete if already exists, asynchronously
+        """
+        try:
+            await self.adelete()
+        except ServiceDoesNotExistException:
+            pass
+
     def delete(self):
         """ delete
         """
+        self._handle_delete(self.endpoint.delete(endpoint=self.name, needs_admin=True))
+
+    async def adelete(self):
+        """ delete, asynchronously
+        """
+        self._handle_delete(
+            await self.async_endpoint.delete(endpoint=self.name, needs_admin=True))
+
+    def dependencies(self):
+        """
+        Resources which must exist before this one can be created
+        :return: list of (service name, resource name)
+        """
+        return []
+
+    def classify_changes(self, changes):
+        """
+        Marks the changes which cannot be applied with an update in place.
+        Every change is in place by default; Index overrides this
+        :param changes: list of schema.Change
+        :return: list of schema.Change
+        """
+        return changes
+
+    def _diff(self, content):
+        if content is None:
+            return None
+        return schema.diff(json.loads(content), self.to_dict(), self.classify_changes)
+
+    def diff(self):
+        """
+        Compares the definition on the service with to_dict()
+        :return: schema.SchemaDiff, None if the resource does not exist
+        """
+        url, cached, headers = self._definition_request(self.endpoint, self.name,
+                                                        self.definition_cache)
+        return self._diff(self._handle_definition(
+            self.endpoint.get(endpoint=self.name, needs_admin=True, headers=headers),
+            url, self.definition_cache, cached, missing_ok=True))
+
+    async def adiff(self):
+        """ diff, asynchronously
+        """
+        url, cached, headers = self._definition_request(self.endpoint, self.name,
+                                                        self.definition_cache)
+        return self._diff(self._handle_definition(
+            await self.async_endpoint.get(endpoint=self.name, needs_admin=True,
+                                          headers=headers),
+            url, self.definition_cache, cached, missing_ok=True))
+
+    def _handle_put(self, result):
         # pylint: disable=maybe-no-member
-        result = self.endpoint.delete(endpoint=self.name, needs_admin=True)
-        if result.status_code == requests.codes.not_found:
-            raise ServiceDoesNotExistException(
-                "Error deleting {service_name}. result: {result}"
+        if result.status_code == requests.codes.precondition_failed:
+            raise AzureSearchServiceException(
+                "{service_name} {name} was changed by someone else during the update"
+                .format(service_name=self.service_name, name=self.name))
+        if result.status_code not in (requests.codes.ok, requests.codes.created,
+                                      requests.codes.no_content):
+            raise AzureSearchServiceException(
+                "Error updating {service_name}. result: {result}"
                 .format(service_name=self.service_name, result=result.content))
+        logging.debug("Successfully updated %s %s", self.service_name, self.name)
+        return result
 
-        if result.status_code != requests.codes.no_content:
-            raise ServiceDoesNotExistException(
-                "Error deleting {service_name}. result: {result}"
-                .format(service_name=self.service_name, result=result.content))
+    def _update_plan(self, changes, allow_rebuild):
+        """ :return: "create", "none", "put" or "rebuild"
+        """
+        if changes is None:
+            return "create"
+        if not changes:
+            return "none"
+        if changes.in_place:
+            return "put"
+        if not allow_rebuild:
+            raise AzureSearchServiceException(
+                "{service_name} {name} cannot be updated in place: {breaking}"
+                .format(service_name=self.service_name, name=self.name,
+                        breaking=", ".join(str(change) for change in changes.breaking)))
+        logging.warning("Rebuilding %s %s for breaking changes: %s", self.service_name,
+                        self.name, ", ".join(str(change) for change in changes.breaking))
+        return "rebuild"
 
-    def update(self):
-        """ update
+    def update(self, allow_rebuild=True, changes=None):
         """
-        try:
-            self.delete()
-        except (AzureSearchServiceException, ServiceDoesNotExistException) as exc:
-            logging.warning(
-                "Failed to delete service. Return result = %s", exc)
-        return self.create()
+        Brings the service's definition in line with to_dict(). Changes which can be
+        applied in place are sent with a PUT conditional on the ETag of the definition
+        they were computed from; only breaking changes delete and recreate the resource
+        (which, for an index, drops its documents: see IndexAlias for rebuilds without
+        downtime)
+        :param allow_rebuild: if False, breaking changes raise AzureSearchServiceException
+        :param changes: SchemaDiff of an existing resource already computed with diff()
+        :return: the response of the last call, None if nothing changed
+        """
+        if changes is None:
+            changes = self.diff()
+        plan = self._update_plan(changes, allow_rebuild)
+        if plan == "create":
+            return self.create()
+        if plan == "put":
+            return self._handle_put(self.endpoint.put(
+                self.to_dict(), endpoint=self.name, needs_admin=True,
+                headers={"If-Match": changes.etag} if changes.etag else None))
+        if plan == "rebuild":
+            self.delete_if_exists()
+            return self.create()
+        return None
+
+    async def aupdate(self, allow_rebuild=True, changes=None):
+        """ update, asynchronously
+        """
+        if changes is None:
+            changes = await self.adiff()
+        plan = self._update_plan(changes, allow_rebuild)
+        if plan == "create":
+            return await self.acreate()
+        if plan == "put":
+            return self._handle_put(await self.async_endpoint.put(
+                self.to_dict(), endpoint=self.name, needs_admin=True,
+                headers={"If-Match": changes.etag} if changes.etag else None))
+        if plan == "rebuild":
+            await self.adelete_if_exists()
+            return await self.acreate()
+        return None
 
     def verify(self):
         """ verify
         """
         return self.get()
 
+    async def averify(self):
+        """ verify, asynchronously
+        """
+        return await self.aget()
+
     @classmethod
-    def list(cls):
-        """ list
+    def _seed_definitions(cls, endpoint, result):
+        """ caches the definitions returned by list, so later gets revalidate them
         """
+        cache = cls.definition_cache
         # pylint: disable=maybe-no-member
-        service_name = cls.SERVICE_NAME
-        result = Endpoint(service_name).get(needs_admin=True)
-        if result.status_code != requests.codes.ok:
-            raise Exception(
-                "Error getting {service}. Result: {result}"
-                .format(service=service_name, result=result))
+        if cache is None or result.status_code != requests.codes.ok:
+            return
+        for source in json.loads(result.content).get('value', []):
+            cache.put(endpoint.query_path(source.get('name')), source.get('@odata.etag'),
+                      json.dumps(source).encode("utf-8"))
 
-        sources = json.loads(result.content)['value']
-
-        insts = []
-        for source in sources:
-            inst = cls.load(source)
-            insts.append(inst)
+    @classmethod
+    def _handle_bound_list(cls, service_name, result, client):
+        insts = cls._handle_list(service_name, result)
+        if client is not None:
+            for inst in insts:
+                inst.bind(client)
         return insts
+
+    @classmethod
+    def list(cls, client=None):
+        """ list
+        :param client: SearchServiceClient to list from, and bind the objects to
+        """
+        service_name = cls.SERVICE_NAME
+        endpoint = cls._class_endpoint(client)
+        result = endpoint.get(needs_admin=True)
+        cls._seed_definitions(endpoint, result)
+        return cls._handle_bound_list(service_name, result, client)
+
+    @classmethod
+    async def alist(cls, client=None):
+        """ list, asynchronously
+        """
+        service_name = cls.SERVICE_NAME
+        if client is not None:
+            endpoint = client.async_endpoint(service_name)
+        else:
+            endpoint = AsyncEndpoint(service_name)
+        async with endpoint:
+            result = await endpoint.get(needs_admin=True)
+        cls._seed_definitions(endpoint, result)
+        return cls._handle_bound_list(service_name, result, client)
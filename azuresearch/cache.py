@@ -0,0 +1,228 @@
+""" cache
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class ResultCache():
+    """
+    Thread safe in-process LRU cache for read results (search, count, suggest),
+    with a time to live and a memory budget.
+    Entries are grouped by namespace (the index name) so writes to an index
+    can invalidate only its entries.
+    :param max_entries: maximum number of entries kept
+    :param ttl: seconds an entry stays valid, None for no expiry
+    :param max_bytes: budget for the sum of the entry sizes, None for no budget
+    """
+
+    def __init__(self, max_entries=1024, ttl=60, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(namespace, operation, params=None):
+        """
+        Normalizes the request parameters into a cache key
+        :param namespace: index name
+        :param operation: search | count | suggest
+        :param params: the request parameters, after remove_empty_values
+        """
+        return (namespace, operation,
+                json.dumps(params, sort_keys=True, separators=(",", ":"), default=str))
+
+    def get(self, namespace, operation, params=None):
+        """
+        :return: the cached value, or MISSING
+        """
+        key = self.make_key(namespace, operation, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, size, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    # pylint: disable=too-many-arguments
+    def put(self, namespace, operation, params, value, size=1):
+        """
+        Stores a value, evicting the least recently used entries as needed
+        :param size: approximate size of value in bytes, counted against max_bytes
+        """
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        key = self.make_key(namespace, operation, params)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size, expires)
+            self._bytes += size
+            while self._entries and (
+                    len(self._entries) > self.max_entries or
+                    (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _remove(self, key, size):
+        del self._entries[key]
+        self._bytes -= size
+
+    def invalidate(self, namespace=None):
+        """
+        Drops all entries of a namespace, or every entry if namespace is None
+        """
+        with self._lock:
+            if namespace is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                keys = [key for key in self._entries if key[0] == namespace]
+                for key in keys:
+                    self._remove(key, self._entries[key][1])
+                removed = len(keys)
+            self.invalidations += removed
+
+    def clear(self):
+        """ drop every entry
+        """
+        self.invalidate()
+
+    def stats(self):
+        """
+        :return: dict of counters (hits, misses, hit_ratio, evictions, expirations,
+                 invalidations, entries, bytes)
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions,
+                    "expirations": self.expirations,
+                    "invalidations": self.invalidations,
+                    "entries": len(self._entries),
+                    "bytes": self._bytes}
+
+
+class DefinitionCache():
+    """
+    Thread safe cache of resource definitions (indexes, skillsets, indexers...) with
+    their ETags, in memory and optionally on disk so new processes start warm.
+    Entries are never trusted blindly: they are revalidated with If-None-Match, and the
+    cached definition is reused when the service answers 304 Not Modified.
+    :param directory: optional directory persisting the entries across processes
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.revalidated = 0
+        self.fetched = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _path(self, url):
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, url):
+        """
+        :param url: URL of the resource, which includes the service and resource names
+        :return: (etag, content) or None
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is not None or not self.directory:
+            return entry
+        try:
+            with open(self._path(url)) as entry_file:
+                stored = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if stored.get("url") != url:
+            return None
+        entry = (stored["etag"], stored["content"].encode("utf-8"))
+        with self._lock:
+            self._entries.setdefault(url, entry)
+        return entry
+
+    def put(self, url, etag, content):
+        """
+        Stores a definition, replacing any previous one
+        :param etag: ETag of the definition, entries without one are not stored
+        :param content: the definition as returned by the service (JSON bytes)
+        """
+        if not etag:
+            return
+        with self._lock:
+            self._entries[url] = (etag, content)
+        if self.directory:
+            path = self._path(url)
+            temporary = "{path}.{thread}.tmp".format(path=path, thread=threading.get_ident())
+            with open(temporary, "w") as entry_file:
+                json.dump({"url": url, "etag": etag, "content": content.decode("utf-8")},
+                          entry_file)
+            os.replace(temporary, path)
+
+    def invalidate(self, url=None):
+        """
+        Drops the entry of a resource, or every entry if url is None
+        """
+        with self._lock:
+            urls = list(self._entries) if url is None else [url]
+            for key in urls:
+                self._entries.pop(key, None)
+        if not self.directory:
+            return
+        if url is None:
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                     if name.endswith(".json")]
+        else:
+            paths = [self._path(url)]
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def record(self, revalidated):
+        """ count a lookup answered from the cache (revalidated) or by a full fetch
+        """
+        with self._lock:
+            if revalidated:
+                self.revalidated += 1
+            else:
+                self.fetched += 1
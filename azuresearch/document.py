@@ -1,5 +1,94 @@
 """ Documents
 """
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from azuresearch.serializer import BatchSerializer, ENVELOPE_OVERHEAD, loads
+
+MAX_BATCH_SIZE = 1000
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+# per document status codes worth resubmitting: version conflict, another indexing
+# operation in progress, service unavailable
+RETRIABLE_DOCUMENT_STATUSES = frozenset([409, 422, 503])
+
+
+Violation = namedtuple("Violation", ["position", "key", "field", "expected", "actual"])
+
+
+class DocumentValidationError(Exception):
+    """
+    Raised when documents don't match the types of the index fields
+    :param violations: list of Violation(position, key, field, expected, actual)
+    """
+
+    def __init__(self, violations):
+        self.violations = violations
+        super().__init__("{count} invalid values: {sample}".format(
+            count=len(violations),
+            sample=", ".join("{key}.{field}: expected {expected}, got {actual}".format(
+                key=v.key, field=v.field, expected=v.expected.__name__,
+                actual=v.actual.__name__) for v in violations[:10])))
+
+
+class DocumentValidator():
+    """
+    Type checks documents against the typed fields of an index.
+    The field name -> python type map is built once, so validating a document
+    only costs one lookup per document value.
+    :param fields: fields of the index
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.field_count = len(fields)
+        self.types = {field.name: field.python_type for field in fields
+                      if field.python_type is not None}
+        key_field = next((field for field in fields if field.key), None)
+        self.key_name = key_field.name if key_field else None
+
+    def is_stale(self, fields):
+        """ whether the validator was built for a different fields list
+        """
+        return fields is not self.fields or len(fields) != self.field_count
+
+    def violations(self, document, position=0):
+        """
+        :param document: document to check
+        :param position: position of the document in its batch, used for reporting
+        :return: list of Violation
+        """
+        types = self.types
+        found = []
+        for name, value in document.items():
+            expected = types.get(name)
+            if expected is not None and not isinstance(value, expected):
+                found.append(Violation(position, document.get(self.key_name), name,
+                                       expected, type(value)))
+        return found
+
+    def validate(self, document):
+        """
+        :raise DocumentValidationError: if the document has invalid values
+        """
+        found = self.violations(document)
+        if found:
+            raise DocumentValidationError(found)
+        return True
+
+    def validate_batch(self, documents):
+        """
+        Validates all documents, reporting every violation at once
+        :raise DocumentValidationError: if any document has invalid values
+        """
+        found = []
+        for position, document in enumerate(documents):
+            found.extend(self.violations(document, position))
+        if found:
+            raise DocumentValidationError(found)
+        return True
 
 
 class Documents():
@@ -8,38 +97,408 @@ class Documents():
 
     def __init__(self, index):
         self.index = index
+        self._serializers = {}
 
     def check_document(self, document):
         """ check_document
+        :raise DocumentValidationError: if the document has invalid values
         """
-        for field in self.index.fields:
-            if field.python_type is not None and field.name in document.keys():
-                if not isinstance(document[field.name], field.python_type):
-                    raise Exception
-        return True
+        return self.index.validator.validate(document)
+
+    def check_documents(self, documents):
+        """ check a batch of documents, reporting all violations at once
+        :raise DocumentValidationError: if any document has invalid values
+        """
+        return self.index.validator.validate_batch(documents)
+
+    def invalidate_cache(self):
+        """ drop the cached search/count results of the index after a write
+        """
+        self.index.invalidate_cache()
+
+    def serializer(self, action):
+        """ the BatchSerializer used for action
+        """
+        serializer = self._serializers.get(action)
+        if serializer is None:
+            serializer = self._serializers.setdefault(action, BatchSerializer(action))
+        return serializer
+
+    def _batch(self, documents, action):
+        """ validates documents and serializes them, without mutating them
+        :return: request body bytes
+        """
+        docs = documents if isinstance(documents, list) else list(documents)
+        self.check_documents(docs)
+        return self.serializer(action).serialize(docs)
 
     def add(self, documents):
-        """ add
         """
-        docs = []
-        for doc in documents:
-            if self.check_document(doc):
-                doc["@search.action"] = "mergeOrUpload"
-                docs.append(doc)
+        add documents in a single request.
+        see bulk_add for batching and resubmission of failed documents
+        :return: the raw response
+        """
+        data = self._batch(documents, "mergeOrUpload")
+        response = self.index.endpoint.post(endpoint=self.index.name + "/docs/index",
+                                            body=data, needs_admin=True, idempotent=True)
+        self.invalidate_cache()
+        return response
 
-        data = {'value': docs}
-        return self.index.endpoint.post(endpoint=self.index.name + "/docs/index",
-                                        data=data, needs_admin=True)
+    async def aadd(self, documents):
+        """ add, asynchronously
+        """
+        data = self._batch(documents, "mergeOrUpload")
+        response = await self.index.async_endpoint.post(
+            endpoint=self.index.name + "/docs/index",
+            body=data, needs_admin=True, idempotent=True)
+        self.invalidate_cache()
+        return response
 
     def delete(self, documents):
         """ delete
         """
-        docs = []
+        data = self._batch(documents, "delete")
+        response = self.index.endpoint.post(endpoint=self.index.name + "/docs/index",
+                                            body=data, needs_admin=True, idempotent=True)
+        self.invalidate_cache()
+        return response
+
+    async def adelete(self, documents):
+        """ delete, asynchronously
+        """
+        data = self._batch(documents, "delete")
+        response = await self.index.async_endpoint.post(
+            endpoint=self.index.name + "/docs/index",
+            body=data, needs_admin=True, idempotent=True)
+        self.invalidate_cache()
+        return response
+
+    def bulk_add(self, documents, **kwargs):
+        """
+        Uploads any number of documents, split into batches within the service limits
+        :param documents: any iterable or generator of documents
+        :param kwargs: BulkIndexer options (max_batch_size, max_batch_bytes,
+                       max_workers, max_pending, max_resubmits)
+        :return: BulkResult
+        """
+        return BulkIndexer(self, action="mergeOrUpload", **kwargs).index(documents)
+
+    def bulk_delete(self, documents, **kwargs):
+        """
+        Deletes any number of documents, split into batches within the service limits
+        :return: BulkResult
+        """
+        return BulkIndexer(self, action="delete", **kwargs).index(documents)
+
+
+class BatchStats():
+    """
+    Counters of one batch sent by a bulk operation
+    :param number: sequence number of the batch, starting at 1
+    :param documents: number of documents in the batch
+    :param size: estimated serialized size of the batch in bytes
+    :param latency: seconds spent sending the batch, including retries
+    :param status_code: status code of the first response
+    :param resubmitted: number of documents resubmitted after failing with a retriable status
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, number, documents, size, latency, status_code, resubmitted=0):
+        self.number = number
+        self.documents = documents
+        self.size = size
+        self.latency = latency
+        self.status_code = status_code
+        self.resubmitted = resubmitted
+
+    def __repr__(self):
+        return "<BatchStats {number}: {documents} documents, {size} bytes, " \
+               "{latency:.3f}s, status {status_code}, " \
+               "{resubmitted} resubmitted>".format(**self.__dict__)
+
+
+class BulkResult():
+    """
+    Aggregated per-key results of a bulk operation.
+    :param results: key -> per document result as returned by the service
+                    ({"key", "status", "errorMessage", "statusCode"})
+    :param stats: BatchStats of every batch sent
+    :param elapsed: wall time of the whole operation in seconds
+    """
+
+    def __init__(self):
+        self.results = {}
+        self.batches = 0
+        self.stats = []
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<BulkResult: {batches} batches, {succeeded} succeeded, {failed} failed>".format(
+            batches=self.batches, succeeded=len(self.succeeded), failed=len(self.failed))
+
+    @property
+    def succeeded(self):
+        """ keys which were indexed successfully
+        """
+        return [key for key, result in self.results.items() if result.get('status')]
+
+    @property
+    def failed(self):
+        """ key -> result for the documents which failed
+        """
+        return {key: result for key, result in self.results.items() if not result.get('status')}
+
+    @property
+    def documents(self):
+        """ number of documents sent
+        """
+        return sum(stat.documents for stat in self.stats)
+
+    @property
+    def documents_per_second(self):
+        """ throughput of the whole operation
+        """
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        """ estimated upload throughput of the whole operation
+        """
+        return sum(stat.size for stat in self.stats) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def resubmitted(self):
+        """ number of documents resubmitted after a retriable failure
+        """
+        return sum(stat.resubmitted for stat in self.stats)
+
+    def add_result(self, result):
+        """ record the result of a single document
+        """
+        with self._lock:
+            self.results[result.get('key')] = result
+
+    def record_response(self, response, keys):
+        """
+        record the per document results of one /docs/index call
+        :param response: response of the /docs/index call
+        :param keys: keys of the documents sent
+        """
+        if response.status_code in (200, 207):
+            results = loads(response.content).get('value', [])
+        else:
+            results = [{"key": key, "status": False,
+                        "statusCode": response.status_code,
+                        "errorMessage": response.text} for key in keys]
+        with self._lock:
+            for result in results:
+                self.results[result.get('key')] = result
+
+    def add_batch(self, documents, size, latency, status_code, resubmitted=0):
+        """
+        record the counters of one batch
+        :return: BatchStats of the batch
+        """
+        with self._lock:
+            self.batches += 1
+            stats = BatchStats(self.batches, documents, size, latency, status_code, resubmitted)
+            self.stats.append(stats)
+        return stats
+
+    def retriable(self, keys):
+        """
+        :param keys: keys to check
+        :return: the subset of keys which failed with a retriable status
+        """
+        with self._lock:
+            return {key for key in keys
+                    if key in self.results and not self.results[key].get('status') and
+                    self.results[key].get('statusCode') in RETRIABLE_DOCUMENT_STATUSES}
+
+    def report(self, sample_size=10):
+        """
+        Compact summary of the documents which failed permanently
+        :param sample_size: maximum number of keys listed per status code
+        :return: status code -> {"count", "keys", "errorMessage"}
+        """
+        report = {}
+        for key, result in self.failed.items():
+            entry = report.setdefault(result.get('statusCode'),
+                                      {"count": 0, "keys": [],
+                                       "errorMessage": result.get('errorMessage')})
+            entry["count"] += 1
+            if len(entry["keys"]) < sample_size:
+                entry["keys"].append(key)
+        return report
+
+
+class BulkIndexer():
+    """
+    Streams documents to an index in batches bounded by both
+    document count and serialized size.
+    :param documents: Documents of the target index
+    :param action: mergeOrUpload | upload | merge | delete
+    :param max_batch_size: maximum number of documents per request
+    :param max_batch_bytes: maximum serialized size of a request
+    :param max_workers: number of batches sent concurrently. Keep it below the
+                        endpoint's pool_maxsize so every worker reuses a pooled connection
+    :param max_pending: maximum number of batches in flight or waiting for a worker.
+                        The source is only read ahead this far, so memory stays bounded
+                        regardless of its size. Defaults to twice max_workers
+    :param max_resubmits: how many times documents failing with a retriable status
+                          (409, 422, 503) are resubmitted, alone, with backoff
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, documents, action="mergeOrUpload",
+                 max_batch_size=MAX_BATCH_SIZE, max_batch_bytes=MAX_BATCH_BYTES,
+                 max_workers=1, max_pending=None, max_resubmits=3):
+        self.documents = documents
+        self.action = action
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending if max_pending else 2 * self.max_workers
+        self.max_resubmits = max_resubmits
+        self.serializer = BatchSerializer(action)
+
+    @property
+    def key_name(self):
+        """ name of the index key field
+        """
+        key_field = self.documents.index.key_field
+        return key_field.name if key_field else None
+
+    def batches(self, documents, result=None):
+        """
+        Splits documents into batches
+        :param documents: any iterable or generator of documents
+        :param result: if given, documents too large for a single request are
+                       recorded as failed in it instead of being sent
+        :return: generator of lists of documents
+        """
+        for batch, _, _ in self._sized_batches(documents, result):
+            yield batch
+
+    def _sized_batches(self, documents, result=None):
+        """
+        Encodes every document once, cutting batches on the exact serialized size
+        :return: generator of (documents, encoded documents, size in bytes)
+        """
+        serializer = self.serializer
+        batch = []
+        encoded = []
+        batch_bytes = ENVELOPE_OVERHEAD
         for doc in documents:
-            if self.check_document(doc):
-                doc["@search.action"] = "delete"
-                docs.append(doc)
+            encoded_doc = serializer.encode(doc)
+            doc_bytes = serializer.encoded_size(encoded_doc) + 1
+            if doc_bytes + ENVELOPE_OVERHEAD > self.max_batch_bytes:
+                logging.warning("Document %s is larger than %s bytes, skipping",
+                                doc.get(self.key_name), self.max_batch_bytes)
+                if result is not None:
+                    result.add_result({"key": doc.get(self.key_name), "status": False,
+                                       "statusCode": 413,
+                                       "errorMessage": "Document exceeds the request size limit"})
+                continue
+            if batch and (len(batch) >= self.max_batch_size or
+                          batch_bytes + doc_bytes > self.max_batch_bytes):
+                yield batch, encoded, batch_bytes
+                batch = []
+                encoded = []
+                batch_bytes = ENVELOPE_OVERHEAD
+            batch.append(doc)
+            encoded.append(encoded_doc)
+            batch_bytes += doc_bytes
+        if batch:
+            yield batch, encoded, batch_bytes
+
+    def send(self, batch, encoded=None):
+        """
+        send one batch
+        :param batch: documents to send
+        :param encoded: the same documents already encoded by the serializer
+        """
+        self.documents.check_documents(batch)
+        body = self.serializer.serialize(batch, encoded)
+        index = self.documents.index
+        response = index.endpoint.post(endpoint=index.name + "/docs/index",
+                                       body=body, needs_admin=True, idempotent=True)
+        self.documents.invalidate_cache()
+        return response
+
+    # pylint: disable=too-many-arguments
+    def _index_batch(self, batch, encoded, size, result):
+        start = time.perf_counter()
+        key_name = self.key_name
+        keys = [doc.get(key_name) for doc in batch]
+        documents = len(batch)
+        response = self.send(batch, encoded)
+        status_code = response.status_code
+        result.record_response(response, keys)
+
+        resubmitted = 0
+        attempt = 0
+        while key_name and attempt < self.max_resubmits:
+            failed_keys = result.retriable(keys)
+            if not failed_keys:
+                break
+            policy = self.documents.index.endpoint.retry_policy
+            time.sleep(policy.backoff(attempt, response))
+            retry = [(doc, enc) for doc, enc in zip(batch, encoded)
+                     if doc.get(key_name) in failed_keys]
+            batch = [doc for doc, _ in retry]
+            encoded = [enc for _, enc in retry]
+            keys = [doc.get(key_name) for doc in batch]
+            logging.debug("Resubmitting %s documents", len(batch))
+            response = self.send(batch, encoded)
+            result.record_response(response, keys)
+            resubmitted += len(batch)
+            attempt += 1
+
+        stats = result.add_batch(documents, size, time.perf_counter() - start,
+                                 status_code, resubmitted)
+        logging.debug("Sent %s", stats)
+        return stats
+
+    def index(self, documents, result=None):
+        """
+        Uploads all documents
+        :param documents: any iterable or generator of documents
+        :param result: BulkResult to accumulate into, shared by several calls.
+                       Its elapsed time is then left to the caller
+        :return: BulkResult
+        """
+        shared = result is not None
+        if not shared:
+            result = BulkResult()
+        start = time.perf_counter()
+        if self.max_workers == 1:
+            for batch, encoded, size in self._sized_batches(documents, result):
+                self._index_batch(batch, encoded, size, result)
+        else:
+            self._index_concurrently(documents, result)
+        if not shared:
+            result.elapsed = time.perf_counter() - start
+        return result
 
-        data = {'value': docs}
-        return self.index.endpoint.post(endpoint=self.index.name + "/docs/index",
-                                        data=data, needs_admin=True)
+    def _index_concurrently(self, documents, result):
+        slots = threading.BoundedSemaphore(self.max_pending)
+        pending = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch, encoded, size in self._sized_batches(documents, result):
+                # blocks the producer until a batch completes, if max_pending are queued
+                slots.acquire()  # pylint: disable=consider-using-with
+                future = executor.submit(self._index_batch, batch, encoded, size, result)
+                future.add_done_callback(lambda _: slots.release())
+                pending.append(future)
+                # surface failures early and drop references to completed batches
+                still_pending = []
+                for pending_future in pending:
+                    if pending_future.done():
+                        pending_future.result()
+                    else:
+                        still_pending.append(pending_future)
+                pending = still_pending
+            for future in pending:
+                future.result()
@@ -98,11 +98,8 @@ class Indexer(BaseApiCall):
 
         # add additional user generated params
         return_dict.update(self.params)
-        # make all params camelCase (to be sent correctly to Azure Search
-        return_dict = self.to_camel_case_dict(return_dict)
-
-        # Remove None values
-        return_dict = self.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = self.to_api_dict(return_dict)
         return return_dict
 
     @classmethod
@@ -120,10 +117,16 @@ class Indexer(BaseApiCall):
 
         return cls(**data)
 
-    def run(self):
-        """ run
+    def dependencies(self):
+        """ the data source, target index and skillset of the indexer
         """
-        result = self.endpoint.post(endpoint="run")
+        dependencies = [("datasources", self.data_source_name),
+                        ("indexes", self.target_index_name),
+                        ("skillsets", self.skillset_name)]
+        return [(service, name) for service, name in dependencies if name]
+
+    @staticmethod
+    def _handle_run(result):
         if result.status_code != requests.codes.accepted:
             raise Exception(
                 "Error running indexer. result: {result}, "
@@ -131,34 +134,37 @@ class Indexer(BaseApiCall):
                     result=result, content=result.content)
             )
 
-    def reset(self):
-        """ reset
+    def run(self):
+        """ run
         """
-        result = self.endpoint.post(endpoint="reset")
-        if result.status_code != requests.codes.no_content:
-            raise Exception(
-                "Error running indexer. result: {result}, "
-                "content: {content}".format(
-                    result=result, content=result.content)
-            )
+        self._handle_run(self.endpoint.post(endpoint="run"))
 
-    def update(self):
-        """ update
+    async def arun(self):
+        """ run, asynchronously
         """
-        result = self.endpoint.post(endpoint="reset")
+        self._handle_run(await self.async_endpoint.post(endpoint="run"))
+
+    @staticmethod
+    def _handle_reset(result):
         if result.status_code != requests.codes.no_content:
             raise Exception(
-                "Error resetting indexer. result: {result}, "
+                "Error running indexer. result: {result}, "
                 "content: {content}".format(
                     result=result, content=result.content)
             )
 
-    def get_status(self):
+    def reset(self):
+        """ reset
         """
-        Get status of running indexer
-        :return:
+        self._handle_reset(self.endpoint.post(endpoint="reset"))
+
+    async def areset(self):
+        """ reset, asynchronously
         """
-        result = self.endpoint.get(endpoint=self.name + "/status")
+        self._handle_reset(await self.async_endpoint.post(endpoint="reset"))
+
+    @staticmethod
+    def _handle_status(result):
         if result.status_code != requests.codes.ok:
             raise Exception(
                 "Error retrieving indexer status. "
@@ -167,3 +173,18 @@ class Indexer(BaseApiCall):
             )
 
         return json.loads(result.content)
+
+    def get_status(self):
+        """
+        Get status of running indexer
+        :return:
+        """
+        return self._handle_status(self.endpoint.get(endpoint=self.name + "/status"))
+
+    async def aget_status(self):
+        """
+        Get status of running indexer, asynchronously
+        :return:
+        """
+        return self._handle_status(
+            await self.async_endpoint.get(endpoint=self.name + "/status"))
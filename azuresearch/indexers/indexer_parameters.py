@@ -32,11 +32,8 @@ class IndexerParameters(AzureSearchObject):
             "data_to_extract": "contentAndMetadata",
             #"image_action": "generateNormalizedImages",
         }
-        # make all params camelCase (to be sent correctly to Azure Search
-        return_dict = self.to_camel_case_dict(return_dict)
-
-        # Remove None values
-        return_dict = self.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = self.to_api_dict(return_dict)
 
         return return_dict
 
@@ -44,10 +41,7 @@ class IndexerParameters(AzureSearchObject):
         return_dict = {"max_failed_items": self.max_failed_items,
                        "max_failed_items_per_batch": self.max_failed_items_per_batch,
                        "configuration": self.configuration}
-        # make all params camelCase (to be sent correctly to Azure Search
-        return_dict = IndexerParameters.to_camel_case_dict(return_dict)
-
-        # Remove None values
-        return_dict = IndexerParameters.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = IndexerParameters.to_api_dict(return_dict)
 
         return return_dict
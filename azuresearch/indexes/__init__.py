@@ -9,3 +9,7 @@ from .field import Field, \
 from .scoring_profile import ScoringProfile, \
     ScoringProfileFunction, ScoringProfileText
 from .suggester import Suggester
+from .search_results import SearchResults, SearchHit, QueryOutcome
+from .cursor import SearchCursor
+from .export import IndexExporter, ExportResult
+from .alias import IndexAlias
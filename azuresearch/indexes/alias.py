@@ -0,0 +1,110 @@
+""" IndexAlias
+"""
+import logging
+import threading
+import time
+
+from azuresearch.base_api_call import AzureSearchServiceException
+
+
+class IndexAlias():
+    """
+    Client side pointer to the live version of an index. Searches, counts and document
+    calls made through the alias go to the current index, and rebuild() replaces it
+    blue/green: the next version (name-vN+1) is created and populated next to the live
+    index, verified, and only then swapped in, so live traffic never sees an empty index.
+    Each attribute lookup resolves the current index once, so a call in flight during a
+    swap completes against the index it started on.
+    :param index: the live Index
+    """
+
+    def __init__(self, index):
+        self._index = index
+        self._swap_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._index, name)
+
+    def __repr__(self):
+        return "<IndexAlias: {name}>".format(name=self._index.name)
+
+    @property
+    def current(self):
+        """ the live Index
+        """
+        return self._index
+
+    def swap(self, index):
+        """
+        Points the alias at another index
+        :return: the previously live Index
+        """
+        with self._swap_lock:
+            previous = self._index
+            self._index = index
+        logging.info("Index alias switched from %s to %s", previous.name, index.name)
+        return previous
+
+    # pylint: disable=too-many-arguments
+    def rebuild(self, populate=None, expected_count=None, retire=False,
+                timeout=60, poll_interval=1.0, **kwargs):
+        """
+        Builds the next version of the live index and swaps it in
+        :param populate: callable receiving the new, empty Index and filling it, e.g. by
+                         running an indexer targeting it or pushing documents. Defaults
+                         to copying the documents of the live index with copy_to
+        :param expected_count: number of documents the new index must reach before the
+                               swap. Defaults to the documents copied, or at least one
+                               document when populate is given
+        :param retire: delete the previous version once the alias points at the new one
+        :param timeout: seconds to wait for the document count to catch up, as counts
+                        lag behind indexing
+        :param poll_interval: seconds between count checks
+        :param kwargs: copy_to options when populate is not given
+        :return: the new live Index
+        """
+        with self._rebuild_lock:
+            live = self._index
+            candidate = live.next_version()
+            logging.info("Building %s to replace %s", candidate.name, live.name)
+            candidate.create()
+            try:
+                if populate is None:
+                    result = live.copy_to(candidate, **kwargs)
+                    if result.failed:
+                        raise AzureSearchServiceException(
+                            "Failed to copy {count} documents to {name}: {report}".format(
+                                count=len(result.failed), name=candidate.name,
+                                report=result.report()))
+                    if expected_count is None:
+                        expected_count = len(result.succeeded)
+                else:
+                    populate(candidate)
+                self._verify(candidate, expected_count, timeout, poll_interval)
+            except Exception:
+                logging.warning("Rebuild of %s failed, deleting %s", live.name, candidate.name)
+                candidate.delete_if_exists()
+                raise
+
+            self.swap(candidate)
+            if retire:
+                live.delete_if_exists()
+            return candidate
+
+    @staticmethod
+    def _verify(index, expected_count, timeout, poll_interval):
+        minimum = 1 if expected_count is None else expected_count
+        deadline = time.monotonic() + timeout
+        while True:
+            index.invalidate_cache()
+            count = index.count()
+            if isinstance(count, int) and count >= minimum:
+                return
+            if time.monotonic() >= deadline:
+                raise AzureSearchServiceException(
+                    "{name} has {count} documents, expected {minimum}".format(
+                        name=index.name, count=count, minimum=minimum))
+            time.sleep(poll_interval)
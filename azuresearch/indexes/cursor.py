@@ -0,0 +1,121 @@
+""" SearchCursor
+"""
+import base64
+import json
+
+
+def odata_literal(value):
+    """ formats a key value as an OData literal
+    """
+    if isinstance(value, str):
+        return "'{0}'".format(value.replace("'", "''"))
+    return json.dumps(value)
+
+
+class SearchCursor():
+    """
+    Pages through the documents of an index ordered by the key field, filtering each page
+    on the last key seen instead of using skip, so every page costs the same regardless
+    of depth and paging is not limited to the 100k skip range.
+    The key field must be sortable and filterable.
+    :param index: the Index to page through
+    :param page_size: documents per page
+    :param filter: optional OData filter applied to every page
+    :param select: optional list of fields to return (the key is always included)
+    :param after: resume after this key (exclusive)
+    :param upper: stop at this key (inclusive), used to page through a key range
+    """
+
+    # pylint: disable=too-many-arguments,redefined-builtin
+    def __init__(self, index, page_size=1000, filter=None, select=None, after=None, upper=None):
+        key_field = index.key_field
+        if key_field is None:
+            raise ValueError("Index {name} has no key field".format(name=index.name))
+        if not key_field.sortable or not key_field.filterable:
+            raise ValueError("The key field {key} must be sortable and filterable "
+                             "to page with a cursor".format(key=key_field.name))
+        self.index = index
+        self.key = key_field.name
+        self.page_size = page_size
+        self.filter = filter
+        self.select = select
+        self.after = after
+        self.upper = upper
+        self.exhausted = False
+
+    def __iter__(self):
+        while True:
+            page = self.next_page()
+            if not page:
+                return
+            for document in page:
+                yield document
+
+    @property
+    def token(self):
+        """
+        Opaque token capturing the cursor position, to resume with from_token
+        """
+        state = {"after": self.after, "upper": self.upper, "filter": self.filter,
+                 "select": self.select, "pageSize": self.page_size,
+                 "exhausted": self.exhausted}
+        return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+
+    @classmethod
+    def from_token(cls, index, token):
+        """
+        Resumes a cursor from a token
+        """
+        state = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        cursor = cls(index, page_size=state["pageSize"], filter=state["filter"],
+                     select=state["select"], after=state["after"], upper=state["upper"])
+        cursor.exhausted = state["exhausted"]
+        return cursor
+
+    def page_filter(self):
+        """ the filter of the next page
+        """
+        clauses = []
+        if self.filter:
+            clauses.append("({0})".format(self.filter))
+        if self.after is not None:
+            clauses.append("{key} gt {value}".format(key=self.key, value=odata_literal(self.after)))
+        if self.upper is not None:
+            clauses.append("{key} le {value}".format(key=self.key, value=odata_literal(self.upper)))
+        return " and ".join(clauses) if clauses else None
+
+    def page_params(self):
+        """ the search parameters of the next page
+        """
+        select = None
+        if self.select:
+            select = list(self.select)
+            if self.key not in select:
+                select.append(self.key)
+        return self.index.remove_empty_values({
+            "search": "*",
+            "orderby": "{key} asc".format(key=self.key),
+            "top": self.page_size,
+            "filter": self.page_filter(),
+            "select": ", ".join(select) if select else None,
+            "count": False
+        })
+
+    def next_page(self):
+        """
+        Fetches the next page and advances the cursor
+        :return: list of documents, empty once the cursor is exhausted
+        """
+        if self.exhausted:
+            return []
+        # pylint: disable=protected-access
+        page = self.index._search_page(self.page_params())
+        documents = page.get('value', [])
+        if documents:
+            self.after = documents[-1][self.key]
+        # the service caps a page at 1000 documents and sends nextPageParameters when
+        # more match, so a short page only ends the walk without them
+        if not documents or (len(documents) < self.page_size and
+                             '@search.nextPageParameters' not in page):
+            self.exhausted = True
+        return documents
@@ -0,0 +1,247 @@
+""" IndexExporter
+"""
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from azuresearch.document import BulkIndexer, BulkResult
+from azuresearch.serializer import dumps
+from .cursor import SearchCursor, odata_literal
+
+MAX_SKIP = 100000
+
+
+class ExportResult():
+    """
+    Counters of an export
+    :param documents: number of documents written
+    :param partitions: number of key range partitions read
+    :param elapsed: wall time in seconds
+    """
+
+    def __init__(self, documents=0, partitions=0, elapsed=0.0):
+        self.documents = documents
+        self.partitions = partitions
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return "<ExportResult: {documents} documents, {partitions} partitions, " \
+               "{elapsed:.1f}s>".format(**self.__dict__)
+
+
+class IndexExporter():
+    """
+    Streams all documents of an index to JSON lines, reading key range partitions
+    concurrently with SearchCursor. Progress is checkpointed after every page, so an
+    interrupted export resumes where each partition stopped. Delivery is at least once:
+    documents of a page written just before an interruption may be written again.
+    :param index: the Index to export
+    :param partitions: number of key ranges read concurrently
+    :param page_size: documents per request
+    :param filter: optional OData filter selecting the documents to export
+    :param select: optional list of fields to export
+    """
+
+    # pylint: disable=too-many-arguments,redefined-builtin
+    def __init__(self, index, partitions=4, page_size=1000, filter=None, select=None):
+        self.index = index
+        self.partitions = max(1, partitions)
+        self.page_size = page_size
+        self.filter = filter
+        self.select = select
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        """ name of the key field
+        """
+        return self.index.key_field.name
+
+    def _filter(self, after=None):
+        clauses = []
+        if self.filter:
+            clauses.append("({0})".format(self.filter))
+        if after is not None:
+            clauses.append("{key} gt {value}".format(key=self.key, value=odata_literal(after)))
+        return " and ".join(clauses) if clauses else None
+
+    def _search(self, **params):
+        params.setdefault("search", "*")
+        # pylint: disable=protected-access
+        return self.index._search_page(self.index.remove_empty_values(params))
+
+    def count(self):
+        """ number of documents to export
+        """
+        return self._search(filter=self._filter(), count=True, top=0).get('@odata.count', 0)
+
+    def partition_bounds(self):
+        """
+        Splits the key space into ranges of about the same number of documents,
+        sampling the keys at evenly spaced positions. Positions beyond the skip limit
+        are reached by hopping: filtering after a sampled key restarts the skip count.
+        :return: list of (lower key exclusive, upper key inclusive), None for unbounded
+        """
+        total = self.count()
+        if self.partitions == 1 or total <= self.page_size:
+            return [(None, None)]
+        boundaries = []
+        after = None
+        base = 0
+        for number in range(1, self.partitions):
+            position = total * number // self.partitions - 1
+            while position - base > MAX_SKIP:
+                after = self._key_at(MAX_SKIP, after)
+                base += MAX_SKIP + 1
+            key = self._key_at(position - base, after)
+            if key is not None and (not boundaries or key != boundaries[-1]):
+                boundaries.append(key)
+        lowers = [None] + boundaries
+        uppers = boundaries + [None]
+        return list(zip(lowers, uppers))
+
+    def _key_at(self, skip, after=None):
+        documents = self._search(orderby="{key} asc".format(key=self.key), top=1, skip=skip,
+                                 select=self.key, filter=self._filter(after),
+                                 count=False).get('value', [])
+        return documents[0][self.key] if documents else None
+
+    def export(self, path_or_stream, compress=None, checkpoint=None):
+        """
+        Exports the documents
+        :param path_or_stream: output file path, or a writable stream (text or binary)
+        :param compress: gzip the output file. Defaults to True for paths ending in .gz
+        :param checkpoint: checkpoint file path. Defaults to <path>.checkpoint for paths;
+                           no checkpoint is kept for streams unless given
+        :return: ExportResult
+        """
+        is_path = isinstance(path_or_stream, (str, os.PathLike))
+        if checkpoint is None and is_path:
+            checkpoint = os.fspath(path_or_stream) + ".checkpoint"
+        state = self._load_checkpoint(checkpoint)
+        mode = "ab" if state is not None else "wb"
+
+        if not is_path:
+            return self.run(self._writer(path_or_stream), checkpoint, state)
+        if compress is None:
+            compress = os.fspath(path_or_stream).endswith(".gz")
+        opener = gzip.open if compress else open
+        with opener(path_or_stream, mode) as stream:
+            return self.run(self._writer(stream), checkpoint, state)
+
+    def _writer(self, stream):
+        text = isinstance(stream, io.TextIOBase)
+
+        def write(documents):
+            lines = b"".join(dumps(document) + b"\n" for document in documents)
+            with self._lock:
+                stream.write(lines.decode("utf-8") if text else lines)
+                stream.flush()
+        return write
+
+    def run(self, consume, checkpoint=None, state=None):
+        """
+        Reads every partition concurrently, handing each page to consume. The checkpoint
+        is saved once consume returns, so a page is read again after an interruption
+        unless it was fully consumed.
+        :param consume: callable receiving a list of documents, without @search. metadata.
+                        Called from several threads at once
+        :param checkpoint: checkpoint file path, None to keep no checkpoint
+        :param state: checkpoint state to resume from. Loaded from checkpoint if None
+        :return: ExportResult
+        """
+        start = time.perf_counter()
+        if state is None:
+            state = self._load_checkpoint(checkpoint)
+        if state is None:
+            state = {"partitions": [{"lower": lower, "upper": upper, "after": lower,
+                                     "done": False, "documents": 0}
+                                    for lower, upper in self.partition_bounds()]}
+        else:
+            logging.info("Resuming export of %s from %s", self.index.name, checkpoint)
+
+        pending = [partition for partition in state["partitions"] if not partition["done"]]
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                futures = [executor.submit(self._read_partition, partition, consume,
+                                           state, checkpoint)
+                           for partition in pending]
+                for future in futures:
+                    future.result()
+
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        partitions = state["partitions"]
+        return ExportResult(sum(partition["documents"] for partition in partitions),
+                            len(partitions), time.perf_counter() - start)
+
+    # pylint: disable=too-many-arguments
+    def copy_to(self, target, transform=None, checkpoint=None, progress=None, **kwargs):
+        """
+        Bulk indexes the documents into another index as partitions are read
+        :param target: the target Index, which must already exist
+        :param transform: optional callable mapping each document to the document to
+                          index, or to None to leave it out
+        :param checkpoint: checkpoint file path to resume an interrupted copy from
+        :param progress: optional callable receiving the BulkResult after every page
+        :param kwargs: BulkIndexer options (max_batch_size, max_batch_bytes,
+                       max_workers, max_pending, max_resubmits)
+        :return: BulkResult of the documents indexed by this run
+        """
+        indexer = BulkIndexer(target.documents, action="mergeOrUpload", **kwargs)
+        result = BulkResult()
+        start = time.perf_counter()
+
+        def index(documents):
+            if transform is not None:
+                documents = [document for document in map(transform, documents)
+                             if document is not None]
+            indexer.index(documents, result)
+            result.elapsed = time.perf_counter() - start
+            logging.info("Copied %s documents from %s to %s, %.0f documents/s",
+                         result.documents, self.index.name, target.name,
+                         result.documents_per_second)
+            if progress is not None:
+                progress(result)
+
+        self.run(index, checkpoint)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _read_partition(self, partition, consume, state, checkpoint):
+        cursor = SearchCursor(self.index, page_size=self.page_size, filter=self.filter,
+                              select=self.select, after=partition["after"],
+                              upper=partition["upper"])
+        while True:
+            documents = [{k: v for k, v in doc.items() if not k.startswith("@search.")}
+                         for doc in cursor.next_page()]
+            if documents:
+                consume(documents)
+            with self._lock:
+                partition["after"] = cursor.after
+                partition["documents"] += len(documents)
+                partition["done"] = cursor.exhausted
+                self._save_checkpoint(checkpoint, state)
+            if cursor.exhausted:
+                return
+
+    @staticmethod
+    def _load_checkpoint(checkpoint):
+        if not checkpoint or not os.path.exists(checkpoint):
+            return None
+        with open(checkpoint) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    @staticmethod
+    def _save_checkpoint(checkpoint, state):
+        if not checkpoint:
+            return
+        temporary = checkpoint + ".tmp"
+        with open(temporary, "w") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(temporary, checkpoint)
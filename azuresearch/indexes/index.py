@@ -1,10 +1,34 @@
 """ index
 """
+import asyncio
+import inspect
 import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from azuresearch.base_api_call import BaseApiCall
-from azuresearch.document import Documents
+from azuresearch.base_api_call import BaseApiCall, AzureSearchServiceException
+from azuresearch.cache import MISSING
+from azuresearch.document import Documents, DocumentValidator
+from azuresearch.schema import classify_index_changes
+from azuresearch.serializer import loads
+from .cursor import SearchCursor
+from .export import IndexExporter
 from .field import Field
+from .search_results import SearchResults, QueryOutcome
+
+VERSION_PATTERN = re.compile(r"^(?P<base>.+)-v(?P<version>\d+)$")
+
+
+def next_version_name(name):
+    """
+    name of the next version of an index: hotels-v3 -> hotels-v4.
+    An unversioned name counts as version 1: hotels -> hotels-v2
+    """
+    match = VERSION_PATTERN.match(name)
+    if match is None:
+        return "{0}-v2".format(name)
+    return "{0}-v{1}".format(match.group("base"), int(match.group("version")) + 1)
 
 # pylint: disable=too-many-instance-attributes
 
@@ -12,7 +36,6 @@ from .field import Field
 class Index(BaseApiCall):
     """ Index
     """
-    results = None
     SERVICE_NAME = 'indexes'
 
     # pylint: disable=too-many-arguments
@@ -26,9 +49,16 @@ class Index(BaseApiCall):
                  token_filters=None,
                  scoring_profiles=None,
                  default_scoring_profile=None,
-                 cors_options=None, **kwargs
+                 cors_options=None,
+                 cache=None, **kwargs
                  ):
+        """
+        :param cache: optional ResultCache for search and count results.
+                      Invalidated by document writes through this index
+        """
         super().__init__(Index.SERVICE_NAME, **kwargs)
+        self.cache = cache
+        self._validator = None
         self.name = name
         self.fields = fields
         self.suggesters = suggesters
@@ -42,8 +72,26 @@ class Index(BaseApiCall):
 
         for field in self.fields:
             field.index_name = self.name
+        for suggester in self.suggesters or []:
+            suggester.index_name = self.name
 
         self.documents = Documents(self)
+        if self.client is not None:
+            for suggester in self.suggesters or []:
+                suggester.bind(self.client)
+
+    def bind(self, client):
+        """
+        Binds the index, its documents and its suggesters to a SearchServiceClient,
+        dropping the results cached from the previous client's service
+        :return: self
+        """
+        if self.client is not None:
+            self.invalidate_cache()
+        super().bind(client)
+        for suggester in self.suggesters or []:
+            suggester.bind(client)
+        return self
 
     def __repr__(self):
         """ __repr__
@@ -70,6 +118,43 @@ class Index(BaseApiCall):
                     charFilters=[chf for chf in self.char_filters],
                     defaultScoringProfile=self.default_scoring_profile)
 
+    @property
+    def fields(self):
+        """ fields
+        """
+        return self._fields
+
+    @fields.setter
+    def fields(self, fields):
+        self._fields = fields
+        self._validator = None
+
+    @property
+    def validator(self):
+        """
+        DocumentValidator compiled from the fields. Rebuilt when fields is reassigned or
+        its length changes; call invalidate_validator() after replacing a field in place
+        """
+        validator = self._validator
+        if validator is None or validator.is_stale(self._fields):
+            validator = DocumentValidator(self._fields)
+            self._validator = validator
+        return validator
+
+    def invalidate_validator(self):
+        """ force the validator to be rebuilt on next use
+        """
+        self._validator = None
+
+    @property
+    def key_field(self):
+        """ the key field of the index, None if not defined
+        """
+        for field in self.fields:
+            if field.key:
+                return field
+        return None
+
     def to_dict(self):
         """ to_dict
         """
@@ -93,11 +178,8 @@ class Index(BaseApiCall):
         }
         # add additional user generated params
         return_dict.update(self.params)
-        # make all params camelCase (to be sent correctly to Azure Search
-        return_dict = self.to_camel_case_dict(return_dict)
-
-        # Remove None values
-        return_dict = self.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = self.to_api_dict(return_dict)
         return return_dict
 
     @classmethod
@@ -132,24 +214,56 @@ class Index(BaseApiCall):
 
         return cls(**data)
 
+    def classify_changes(self, changes):
+        """ see schema.classify_index_changes
+        """
+        return classify_index_changes(changes)
+
+    def next_version(self):
+        """
+        A new Index with the same definition named after the next version (see
+        next_version_name), sharing this index's client or endpoints and its caches, its
+        suggesters' included. It is not created
+        """
+        # pylint: disable=protected-access
+        data = self.to_dict()
+        data["name"] = next_version_name(self.name)
+        index = Index.load(data)
+        index.cache = self.cache
+        if self.client is not None:
+            index.bind(self.client)
+        else:
+            index.endpoint = self.endpoint
+            index._async_endpoint = self._async_endpoint
+        for suggester, current in zip(index.suggesters or [], self.suggesters or []):
+            suggester.cache = current.cache
+            if self.client is None:
+                suggester.endpoint = current.endpoint
+                suggester._async_endpoint = current._async_endpoint
+        return index
+
     def verify(self):
         """ verify
         """
         return self.get()
 
-    def search(self,
-               query,
-               query_type='simple',
-               search_mode='all',
-               count=True,
-               order_by=None,
-               search_fields=None,
-               select=None,
-               top=None,
-               **kwargs
-               ):
-        """ search
+    async def averify(self):
+        """ verify, asynchronously
         """
+        return await self.aget()
+
+    # pylint: disable=too-many-arguments
+    def _search_params(self,
+                       query,
+                       query_type='simple',
+                       search_mode='all',
+                       count=True,
+                       order_by=None,
+                       search_fields=None,
+                       select=None,
+                       top=None,
+                       **kwargs
+                       ):
         params = {
             "search": '"{0}"'.format(query),
             "searchMode": search_mode,
@@ -162,30 +276,306 @@ class Index(BaseApiCall):
         }
         params.update(kwargs)
 
-        params = self.remove_empty_values(params)
+        return self.remove_empty_values(params)
 
-        self.results = self.endpoint.post(data=params,
-                                         endpoint=self.name + "/docs/search/")
-        return self.results
+    @property
+    def cache_namespace(self):
+        """
+        cache namespace of this index's results: its url, so indexes of the same name
+        on different services never share entries
+        """
+        return self.endpoint.query_path(self.name)
 
-    def statistics(self):
-        """ statistics
+    def _cache_get(self, operation, params=None):
+        if self.cache is None:
+            return MISSING
+        return self.cache.get(self.cache_namespace, operation, params)
+
+    def _cache_put(self, operation, params, value, size):
+        if self.cache is not None:
+            self.cache.put(self.cache_namespace, operation, params, value, size)
+
+    def invalidate_cache(self):
+        """ drop the cached results of this index, including its suggestions
+        """
+        if self.cache is not None:
+            self.cache.invalidate(self.cache_namespace)
+        for suggester in self.suggesters or []:
+            suggester.invalidate_cache()
+
+    def _handle_search(self, response):
+        if response.status_code != 200:
+            raise AzureSearchServiceException(
+                "Error searching {name}. result: {result}"
+                .format(name=self.name, result=response.content))
+        return response.content
+
+    def _post_search(self, params):
+        return self._handle_search(self.endpoint.post(data=params,
+                                                      endpoint=self.name + "/docs/search/",
+                                                      idempotent=True, coalesce=True))
+
+    async def _apost_search(self, params):
+        return self._handle_search(await self.async_endpoint.post(
+            data=params, endpoint=self.name + "/docs/search/",
+            idempotent=True, coalesce=True))
+
+    def _search_page(self, params):
+        return loads(self._post_search(params))
+
+    def search(self, query, *args, **kwargs):
+        """ search
+        :param query: search text
+        :param args: query_type, search_mode, count, order_by, search_fields, select, top
+        :param kwargs: any of the above, or any additional search parameter
+        :return: SearchResults
+        :raise AzureSearchServiceException: if the search failed
+        """
+        params = self._search_params(query, *args, **kwargs)
+        raw = self._cache_get("search", params)
+        if raw is MISSING:
+            raw = self._post_search(params)
+            self._cache_put("search", params, raw, len(raw))
+        return SearchResults(raw)
+
+    def next_page(self, results):
+        """
+        :param results: SearchResults of a previous search
+        :return: SearchResults of the following page, None if results was the last page
+        """
+        if results.continuation is None:
+            return None
+        return SearchResults(self._post_search(dict(results.continuation)))
+
+    def iter_search(self, query, *args, page_size=None, max_results=None, prefetch=True,
+                    **kwargs):
+        """
+        Iterates over the documents matching a query, across as many pages as needed.
+        Follows @search.nextPageParameters, or pages with skip when page_size is set.
+        :param query: search text
+        :param args: see search
+        :param page_size: documents requested per page (top). If None the service decides
+        :param max_results: stop after this many documents
+        :param prefetch: if True, the next page is fetched in the background
+                         while the current one is consumed
+        :param kwargs: see search
+        :return: generator of documents
+        """
+        params = self._search_params(query, *args, **kwargs)
+        if page_size:
+            params['top'] = page_size
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        next_page = None
+        yielded = 0
+        try:
+            page = self._search_page(params)
+            while True:
+                documents = page.get('value', [])
+                next_params = page.get('@search.nextPageParameters')
+                if next_params is None and page_size and len(documents) == page_size:
+                    next_params = dict(params, skip=params.get('skip', 0) + page_size)
+                if max_results is not None and yielded + len(documents) >= max_results:
+                    next_params = None
+                next_page = None
+                if next_params is not None and executor is not None:
+                    next_page = executor.submit(self._search_page, next_params)
+
+                for document in documents:
+                    if max_results is not None and yielded >= max_results:
+                        return
+                    yielded += 1
+                    yield document
+
+                if next_params is None:
+                    return
+                params = next_params
+                page = next_page.result() if next_page is not None \
+                    else self._search_page(params)
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def cursor(self, page_size=1000, token=None, **kwargs):
+        """
+        Returns a SearchCursor paging through the whole index in key order,
+        at a constant cost per page
+        :param page_size: documents per page
+        :param token: resume a previous cursor from its token
+        :param kwargs: filter, select, after, upper (see SearchCursor)
+        """
+        if token is not None:
+            return SearchCursor.from_token(self, token)
+        return SearchCursor(self, page_size=page_size, **kwargs)
+
+    # pylint: disable=too-many-arguments,redefined-builtin
+    def export(self, path_or_stream, partitions=4, page_size=1000, filter=None, select=None,
+               compress=None, checkpoint=None):
+        """
+        Streams every document of the index to JSON lines, reading key ranges concurrently.
+        An interrupted export resumes from its checkpoint. See IndexExporter
+        :param path_or_stream: output file path, or a writable stream
+        :param partitions: number of key ranges read concurrently
+        :param page_size: documents per request
+        :param filter: optional OData filter selecting the documents to export
+        :param select: optional list of fields to export
+        :param compress: gzip the output file. Defaults to True for paths ending in .gz
+        :param checkpoint: checkpoint file path, defaults to <path>.checkpoint
+        :return: ExportResult
+        """
+        exporter = IndexExporter(self, partitions=partitions, page_size=page_size,
+                                 filter=filter, select=select)
+        return exporter.export(path_or_stream, compress=compress, checkpoint=checkpoint)
+
+    # pylint: disable=too-many-arguments,redefined-builtin
+    def copy_to(self, target_index, transform=None, partitions=4, page_size=1000, filter=None,
+                checkpoint=None, progress=None, **kwargs):
+        """
+        Copies the documents into another index, e.g. one created with a different analyzer.
+        Partitions are read concurrently as for export, and every page is bulk indexed
+        into the target. An interrupted copy resumes from its checkpoint
+        :param target_index: the target Index, which must already exist
+        :param transform: optional callable mapping each document to the document to
+                          index, or to None to leave it out
+        :param partitions: number of key ranges read concurrently
+        :param page_size: documents read per request
+        :param filter: optional OData filter selecting the documents to copy
+        :param checkpoint: checkpoint file path to resume from
+        :param progress: optional callable receiving the running BulkResult after every page
+        :param kwargs: BulkIndexer options (max_batch_size, max_batch_bytes,
+                       max_workers, max_pending, max_resubmits)
+        :return: BulkResult
+        """
+        exporter = IndexExporter(self, partitions=partitions, page_size=page_size,
+                                 filter=filter)
+        return exporter.copy_to(target_index, transform=transform, checkpoint=checkpoint,
+                                progress=progress, **kwargs)
+
+    async def asearch(self, query, *args, **kwargs):
+        """ search, asynchronously
+        :return: SearchResults
+        """
+        params = self._search_params(query, *args, **kwargs)
+        raw = self._cache_get("search", params)
+        if raw is MISSING:
+            raw = await self._apost_search(params)
+            self._cache_put("search", params, raw, len(raw))
+        return SearchResults(raw)
+
+    @staticmethod
+    def _query_arguments(query):
+        if isinstance(query, dict):
+            kwargs = dict(query)
+            return kwargs.pop('query'), kwargs
+        return query, {}
+
+    @classmethod
+    def _query_outcome(cls, query, search):
+        """
+        Runs one query of a batch, timing it and capturing its error, a malformed query
+        included. search(text, **kwargs) returns the results, or an awaitable of them
+        :return: QueryOutcome, or an awaitable of it if search returned one
+        """
+        start = time.perf_counter()
+        try:
+            text, kwargs = cls._query_arguments(query)
+            results = search(text, **kwargs)
+        except Exception as exc:  # pylint: disable=broad-except
+            return QueryOutcome(query, error=exc, latency=time.perf_counter() - start)
+        if not inspect.isawaitable(results):
+            return QueryOutcome(query, results, latency=time.perf_counter() - start)
+
+        async def outcome():
+            try:
+                awaited = await results
+            except Exception as exc:  # pylint: disable=broad-except
+                return QueryOutcome(query, error=exc, latency=time.perf_counter() - start)
+            return QueryOutcome(query, awaited, latency=time.perf_counter() - start)
+        return outcome()
+
+    def _search_outcome(self, query):
+        return self._query_outcome(query, self.search)
+
+    def search_many(self, queries, max_concurrency=8):
         """
-        response = self.endpoint.get(
-            endpoint=self.name + "/stats", needs_admin=True)
+        Runs independent queries concurrently over the pooled connection.
+        A failing query does not fail the batch: its error is reported in its outcome.
+        :param queries: search texts, or dicts of search arguments with a 'query' key
+        :param max_concurrency: maximum number of queries in flight
+        :return: list of QueryOutcome, in the order of queries
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(queries))) as executor:
+            return list(executor.map(self._search_outcome, queries))
+
+    async def asearch_many(self, queries, max_concurrency=8):
+        """ search_many, asynchronously
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def outcome(query):
+            async with semaphore:
+                pending = self._query_outcome(query, self.asearch)
+                return await pending if inspect.isawaitable(pending) else pending
+
+        return list(await asyncio.gather(*[outcome(query) for query in queries]))
+
+    async def anext_page(self, results):
+        """ next_page, asynchronously
+        """
+        if results.continuation is None:
+            return None
+        return SearchResults(await self._apost_search(dict(results.continuation)))
+
+    @staticmethod
+    def _handle_statistics(response):
         if response.status_code == 200:
             recent_stats = response.json()
             return recent_stats
         return response
 
-    def count(self):
-        """ count
+    def statistics(self):
+        """ statistics
         """
-        # https://docs.microsoft.com/en-us/rest/api/searchservice/count-documents
-        response = self.endpoint.get(
-            endpoint=self.name + "/docs/$count", needs_admin=True)
+        return self._handle_statistics(self.endpoint.get(
+            endpoint=self.name + "/stats", needs_admin=True))
+
+    async def astatistics(self):
+        """ statistics, asynchronously
+        """
+        return self._handle_statistics(await self.async_endpoint.get(
+            endpoint=self.name + "/stats", needs_admin=True))
+
+    @staticmethod
+    def _handle_count(response):
         if response.status_code == 200:
             response.encoding = "utf-8-sig"
             recent_count = int(response.text)
             return recent_count
         return response
+
+    def count(self):
+        """ count
+        """
+        # https://docs.microsoft.com/en-us/rest/api/searchservice/count-documents
+        count = self._cache_get("count")
+        if count is MISSING:
+            count = self._handle_count(self.endpoint.get(
+                endpoint=self.name + "/docs/$count", needs_admin=True))
+            if isinstance(count, int):
+                self._cache_put("count", None, count, 1)
+        return count
+
+    async def acount(self):
+        """ count, asynchronously
+        """
+        count = self._cache_get("count")
+        if count is MISSING:
+            count = self._handle_count(await self.async_endpoint.get(
+                endpoint=self.name + "/docs/$count", needs_admin=True))
+            if isinstance(count, int):
+                self._cache_put("count", None, count, 1)
+        return count
@@ -36,9 +36,8 @@ class ScoringProfile(AzureSearchObject):
         }
 
         return_dict.update(self.params)
-        return_dict = self.to_camel_case_dict(return_dict)
-
-        return_dict = self.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = self.to_api_dict(return_dict)
         return return_dict
 
     @classmethod
@@ -77,10 +76,8 @@ class ScoringProfileText(AzureSearchObject):
 
         # add additional user generated params
         return_dict.update(self.params)
-        # make all params camelCase (to be sent correctly to Azure Search
-        return_dict = self.to_camel_case_dict(return_dict)
-
-        return_dict = self.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = self.to_api_dict(return_dict)
         return return_dict
 
     @classmethod
@@ -138,9 +135,8 @@ class ScoringProfileFunction(AzureSearchObject):
             "tag": self.tag
         }
         return_dict.update(self.params)
-        return_dict = self.to_camel_case_dict(return_dict)
-
-        return_dict = self.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = self.to_api_dict(return_dict)
         return return_dict
 
     def _validate_interpolation(self):
@@ -0,0 +1,213 @@
+""" SearchResults
+"""
+import json
+import re
+from types import MappingProxyType
+
+from azuresearch.serializer import loads, dumps
+
+# Response level annotations. Document keys cannot start with '@', and a quote inside a
+# string value is always escaped, so these patterns only match the response's own keys
+_METADATA = re.compile(r'"(@odata\.count|@search\.coverage|@search\.facets|'
+                       r'@search\.nextPageParameters)"\s*:\s*')
+_SCORE = re.compile(r'"@search\.score"\s*:\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)')
+_DECODER = json.JSONDecoder()
+
+
+class SearchHit():
+    """
+    A single search hit
+    :param document: the document fields
+    :param score: relevance score (@search.score)
+    :param highlights: highlighted fragments per field (@search.highlights), if requested
+    """
+    __slots__ = ('document', 'score', 'highlights')
+
+    def __init__(self, document, score=None, highlights=None):
+        self.document = document
+        self.score = score
+        self.highlights = highlights
+
+    def __repr__(self):
+        return "<SearchHit: score {score}>".format(score=self.score)
+
+    def __getitem__(self, item):
+        return self.document[item]
+
+    def to_dict(self):
+        """ the hit as returned by the service
+        """
+        hit = dict(self.document)
+        hit['@search.score'] = self.score
+        if self.highlights is not None:
+            hit['@search.highlights'] = self.highlights
+        return hit
+
+
+class SearchResults():
+    """
+    Immutable result of a single search request, decoded lazily.
+    count, coverage, facets, continuation and scores are read from the raw response
+    without decoding the documents; documents are decoded on first access only.
+    status_code and content mirror the requests.Response search used to return.
+    :param payload: raw response bytes, or an already decoded response
+    :param status_code: status code of the response the results were built from.
+                        Failed searches raise instead of returning results
+    """
+    __slots__ = ('_raw', '_text', '_metadata', '_hits', '_payload', '_status_code')
+
+    def __init__(self, payload, status_code=200):
+        raw = None if isinstance(payload, dict) else payload
+        object.__setattr__(self, '_status_code', status_code)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_text', None)
+        object.__setattr__(self, '_metadata', None)
+        object.__setattr__(self, '_hits', None)
+        object.__setattr__(self, '_payload', payload if raw is None else None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SearchResults is immutable")
+
+    def __repr__(self):
+        return "<SearchResults: {documents} documents, count: {count}>".format(
+            documents=len(self), count=self.count)
+
+    def __len__(self):
+        return len(self.hits)
+
+    def __iter__(self):
+        return iter(self.hits)
+
+    def __getitem__(self, item):
+        return self.hits[item]
+
+    @property
+    def status_code(self):
+        """ status code of the search response
+        """
+        return self._status_code
+
+    @property
+    def content(self):
+        """ the raw response body (bytes)
+        """
+        if self._raw is not None:
+            return self._raw if isinstance(self._raw, bytes) else self._raw.encode('utf-8')
+        return dumps(self._payload)
+
+    @property
+    def _decoded_text(self):
+        text = self._text
+        if text is None:
+            raw = self._raw
+            text = raw.decode('utf-8-sig') if isinstance(raw, bytes) else raw
+            object.__setattr__(self, '_text', text)
+        return text
+
+    def _meta(self):
+        metadata = self._metadata
+        if metadata is None:
+            if self._payload is not None:
+                metadata = self._payload
+            else:
+                text = self._decoded_text
+                metadata = {}
+                for match in _METADATA.finditer(text):
+                    metadata[match.group(1)] = _DECODER.raw_decode(text, match.end())[0]
+            object.__setattr__(self, '_metadata', metadata)
+        return metadata
+
+    @property
+    def hits(self):
+        """ tuple of SearchHit, decoded on first access
+        """
+        hits = self._hits
+        if hits is None:
+            if self._payload is not None:
+                # copies, so the caller's payload is left untouched
+                documents = [dict(doc) for doc in self._payload.get('value', ())]
+            else:
+                payload = loads(self._raw)
+                documents = payload.pop('value', ())
+                if self._metadata is None:
+                    object.__setattr__(self, '_metadata', payload)
+            hits = tuple(SearchHit(doc,
+                                   doc.pop('@search.score', None),
+                                   doc.pop('@search.highlights', None))
+                         for doc in documents)
+            object.__setattr__(self, '_hits', hits)
+        return hits
+
+    @property
+    def documents(self):
+        """ tuple of matching documents, without the @search annotations
+        """
+        return tuple(hit.document for hit in self.hits)
+
+    @property
+    def scores(self):
+        """ relevance scores of the hits, in order
+        """
+        if self._hits is not None or self._raw is None:
+            return [hit.score for hit in self.hits]
+        return [float(score) for score in _SCORE.findall(self._decoded_text)]
+
+    @property
+    def count(self):
+        """ total number of matches (@odata.count), None if not requested
+        """
+        return self._meta().get('@odata.count')
+
+    @property
+    def facets(self):
+        """ facet name -> list of buckets (@search.facets)
+        """
+        return MappingProxyType(self._meta().get('@search.facets') or {})
+
+    @property
+    def coverage(self):
+        """ percentage of the index covered by the query (@search.coverage)
+        """
+        return self._meta().get('@search.coverage')
+
+    @property
+    def continuation(self):
+        """ parameters of the next page (@search.nextPageParameters), None on the last page
+        """
+        continuation = self._meta().get('@search.nextPageParameters')
+        return MappingProxyType(continuation) if continuation is not None else None
+
+    def json(self):
+        """
+        The response payload, as returned by requests.Response.json()
+        """
+        if self._raw is not None:
+            return loads(self._raw)
+        return dict(self._payload)
+
+
+class QueryOutcome():
+    """
+    Outcome of one query of a multi-query batch
+    :param query: the query as given (search text or dict of search arguments)
+    :param results: SearchResults, None if the query failed
+    :param error: the exception raised by the query, None if it succeeded
+    :param latency: seconds spent on the query
+    """
+    __slots__ = ('query', 'results', 'error', 'latency')
+
+    def __init__(self, query, results=None, error=None, latency=0.0):
+        self.query = query
+        self.results = results
+        self.error = error
+        self.latency = latency
+
+    def __repr__(self):
+        return "<QueryOutcome: {query!r}, {status}, {latency:.3f}s>".format(
+            query=self.query, status="failed" if self.error else "ok", latency=self.latency)
+
+    @property
+    def ok(self):
+        """ whether the query succeeded
+        """
+        return self.error is None
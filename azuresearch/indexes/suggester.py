@@ -1,14 +1,23 @@
 """ Suggester
 """
 from azuresearch.base_api_call import BaseApiCall
+from azuresearch.cache import MISSING
+from azuresearch.service import BufferedResponse
 
 
 class Suggester(BaseApiCall):
     """ Suggester
     """
 
-    def __init__(self, name, source_fields, search_mode="analyzingInfixMatching", **kwargs):
+    def __init__(self, name, source_fields, search_mode="analyzingInfixMatching",
+                 cache=None, **kwargs):
+        """
+        :param cache: optional ResultCache for suggestions
+        """
         super().__init__("indexes", **kwargs)
+        self.cache = cache
+        # set by the owning Index, so writes to it invalidate cached suggestions
+        self.index_name = None
         self.name = name
         self.source_fields = source_fields
         self.search_mode = search_mode
@@ -34,21 +43,77 @@ class Suggester(BaseApiCall):
         # add additional user generated params
         return_dict.update(self.params)
 
-        # make all params camelCase (to be sent correctly to Azure Search
-        return_dict = self.to_camel_case_dict(return_dict)
-
-        # Remove None values
-        return_dict = self.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = self.to_api_dict(return_dict)
         return return_dict
 
-    def suggest(self, query):
-        """ suggest
-        """
-        query = {
+    @staticmethod
+    def _suggest_params(query):
+        return {
             "search": query,
             "queryType": "full",
             "searchMode": "analyzingInfixMatching"
         }
-        results = self.endpoint.post(
-            query, endpoint=self.name + "/docs/suggest")
+
+    @property
+    def cache_namespace(self):
+        """
+        cache namespace of the suggestions: the owning index's url when known, so writes
+        to the index invalidate them and other services never share them
+        """
+        return self.endpoint.query_path(self.index_name or self.name)
+
+    def invalidate_cache(self):
+        """ drop the cached suggestions
+        """
+        if self.cache is not None:
+            self.cache.invalidate(self.cache_namespace)
+
+    def bind(self, client):
+        """
+        Binds the suggester to a SearchServiceClient, dropping the suggestions cached
+        from the previous client's service
+        :return: self
+        """
+        if self.client is not None:
+            self.invalidate_cache()
+        return super().bind(client)
+
+    def _cache_get(self, params):
+        if self.cache is None:
+            return MISSING
+        cached = self.cache.get(self.cache_namespace, "suggest", params)
+        if cached is MISSING:
+            return MISSING
+        # every caller gets its own response around the immutable cached body
+        content, headers = cached
+        return BufferedResponse(200, content, headers=dict(headers))
+
+    def _cache_put(self, params, results):
+        if self.cache is not None and results.status_code == 200:
+            self.cache.put(self.cache_namespace, "suggest", params,
+                           (results.content, dict(results.headers)), len(results.content))
+
+    def suggest(self, query):
+        """ suggest
+        """
+        params = self._suggest_params(query)
+        results = self._cache_get(params)
+        if results is MISSING:
+            results = self.endpoint.post(
+                params, endpoint=self.name + "/docs/suggest",
+                idempotent=True, coalesce=True)
+            self._cache_put(params, results)
+        return results
+
+    async def asuggest(self, query):
+        """ suggest, asynchronously
+        """
+        params = self._suggest_params(query)
+        results = self._cache_get(params)
+        if results is MISSING:
+            results = await self.async_endpoint.post(
+                params, endpoint=self.name + "/docs/suggest",
+                idempotent=True, coalesce=True)
+            self._cache_put(params, results)
         return results
@@ -0,0 +1,173 @@
+""" ProvisioningPlan
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+
+
+def resource_key(resource):
+    """ (service name, resource name) identifying a resource
+    """
+    return resource.service_name, resource.name
+
+
+class ProvisioningResult():
+    """
+    Outcome of a provisioning run, resources identified by (service name, name)
+    :param applied: key -> created | updated | unchanged, in completion order
+    :param failed: key -> exception raised while applying the resource
+    :param skipped: keys not applied because a dependency failed (or, with rollback,
+                    because the run stopped)
+    :param rolled_back: keys of created resources deleted by the rollback
+    """
+
+    def __init__(self):
+        self.applied = {}
+        self.failed = {}
+        self.skipped = []
+        self.rolled_back = []
+
+    def __repr__(self):
+        return "<ProvisioningResult: {applied} applied, {failed} failed, {skipped} skipped, " \
+               "{rolled_back} rolled back>".format(applied=len(self.applied),
+                                                   failed=len(self.failed),
+                                                   skipped=len(self.skipped),
+                                                   rolled_back=len(self.rolled_back))
+
+    @property
+    def ok(self):
+        """ True if every resource was applied
+        """
+        return not self.failed and not self.skipped
+
+    @property
+    def created(self):
+        """ keys of the resources created by the run, in creation order
+        """
+        return [key for key, outcome in self.applied.items() if outcome == CREATED]
+
+
+class ProvisioningPlan():
+    """
+    Creates or updates a set of resources (data sources, indexes, skillsets, indexers...)
+    concurrently, in dependency order: a resource is applied once every resource it
+    depends on (see BaseApiCall.dependencies) has been applied. Dependencies outside the
+    plan are expected to exist already.
+    :param resources: BaseApiCall objects
+    :param max_workers: maximum number of resources applied at the same time
+    :param allow_rebuild: passed to update() for existing resources with breaking changes
+    """
+
+    def __init__(self, resources, max_workers=8, allow_rebuild=False):
+        self.resources = {}
+        for resource in resources:
+            key = resource_key(resource)
+            if key in self.resources:
+                raise ValueError("{0} {1} is in the plan twice".format(*key))
+            self.resources[key] = resource
+        self.max_workers = max(1, max_workers)
+        self.allow_rebuild = allow_rebuild
+        self.dependencies = {key: [dependency for dependency in resource.dependencies()
+                                   if dependency in self.resources]
+                             for key, resource in self.resources.items()}
+        self.levels()
+
+    def levels(self):
+        """
+        Groups the resources by depth in the dependency graph; resources of a level only
+        depend on resources of earlier levels
+        :return: list of lists of keys
+        :raises ValueError: on a dependency cycle
+        """
+        remaining = dict(self.dependencies)
+        done = set()
+        levels = []
+        while remaining:
+            level = sorted(key for key, dependencies in remaining.items()
+                           if all(dependency in done for dependency in dependencies))
+            if not level:
+                raise ValueError("Dependency cycle between {0}".format(sorted(remaining)))
+            levels.append(level)
+            done.update(level)
+            for key in level:
+                del remaining[key]
+        return levels
+
+    def _apply(self, resource):
+        changes = resource.diff()
+        if changes is None:
+            resource.create()
+            return CREATED
+        if not changes:
+            return UNCHANGED
+        resource.update(allow_rebuild=self.allow_rebuild, changes=changes)
+        return UPDATED
+
+    def _dependents(self, key):
+        """ every resource depending on key, directly or not
+        """
+        dependents = set()
+        pending = [key]
+        while pending:
+            current = pending.pop()
+            for other, dependencies in self.dependencies.items():
+                if current in dependencies and other not in dependents:
+                    dependents.add(other)
+                    pending.append(other)
+        return dependents
+
+    def run(self, rollback=False):
+        """
+        Applies every resource, creating missing ones and updating changed ones
+        :param rollback: on the first failure, stop starting new resources and delete
+                         the resources this run created, dependents first. Updated
+                         resources are left as they are. Without rollback, resources
+                         which do not depend on the failed one are still applied
+        :return: ProvisioningResult
+        """
+        result = ProvisioningResult()
+        waiting = {key: set(dependencies) for key, dependencies in self.dependencies.items()}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while waiting or running:
+                stop = rollback and result.failed
+                ready = [] if stop else sorted(key for key, dependencies in waiting.items()
+                                               if not dependencies)
+                for key in ready:
+                    del waiting[key]
+                    running[executor.submit(self._apply, self.resources[key])] = key
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as exc:  # pylint: disable=broad-except
+                        logging.warning("Failed to apply %s %s: %s", key[0], key[1], exc)
+                        result.failed[key] = exc
+                        for dependent in self._dependents(key):
+                            if waiting.pop(dependent, None) is not None:
+                                result.skipped.append(dependent)
+                        continue
+                    logging.info("%s %s %s", key[0], key[1], outcome)
+                    result.applied[key] = outcome
+                    for dependencies in waiting.values():
+                        dependencies.discard(key)
+        result.skipped.extend(sorted(waiting))
+
+        if rollback and result.failed:
+            self._rollback(result)
+        return result
+
+    def _rollback(self, result):
+        for key in reversed(result.created):
+            try:
+                self.resources[key].delete_if_exists()
+            except Exception as exc:  # pylint: disable=broad-except
+                logging.warning("Failed to roll back %s %s: %s", key[0], key[1], exc)
+                continue
+            result.rolled_back.append(key)
@@ -0,0 +1,155 @@
+""" retry
+"""
+import email.utils
+import random
+import threading
+import time
+
+RETRY_STATUSES = frozenset([429, 503])
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "PUT", "DELETE", "OPTIONS"])
+THROTTLED = 429
+
+
+class RetryBudget():
+    """
+    Token bucket limiting retries to a fraction of the request volume,
+    so a throttling storm is not amplified by every client retrying every call.
+    :param ratio: tokens earned per request; one token is spent per retry
+    :param min_tokens: tokens available up front, so low-volume clients can still retry
+    :param max_tokens: cap on the stored tokens
+    """
+
+    def __init__(self, ratio=0.2, min_tokens=10, max_tokens=100):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self):
+        """ tokens currently available
+        """
+        return self._tokens
+
+    def deposit(self):
+        """ called once per request
+        """
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """
+        called once per retry
+        :return: True if the retry is allowed
+        """
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class RetryPolicy():
+    """
+    Exponential backoff with full jitter, honoring Retry-After headers.
+    Idempotent requests are retried on any of retry_statuses and on connection errors;
+    non idempotent ones only when the service throttled them (429),
+    as a throttled request was rejected before being processed.
+    :param max_retries: maximum number of retries per request (0 disables retries)
+    :param backoff_factor: base delay in seconds, doubled on every attempt
+    :param max_backoff: maximum computed delay in seconds
+    :param max_retry_after: maximum delay honored from a Retry-After header
+    :param jitter: if True, the computed delay is drawn uniformly from [0, delay]
+    :param retry_statuses: HTTP status codes considered transient
+    :param budget: RetryBudget shared by all requests using this policy
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=30,
+                 max_retry_after=60, jitter=True, retry_statuses=RETRY_STATUSES,
+                 budget=None):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def is_idempotent(self, method, idempotent=None):
+        """ whether the request may safely be sent again
+        """
+        if idempotent is not None:
+            return idempotent
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def record_request(self):
+        """ record a first attempt, feeding the retry budget
+        """
+        self.budget.deposit()
+
+    def should_retry(self, method, attempt, status_code=None, idempotent=None):
+        """
+        :param method: HTTP method
+        :param attempt: number of retries already made
+        :param status_code: response status code, None for a connection error
+        :param idempotent: overrides the method based idempotency rule
+        :return: True if the request should be retried
+        """
+        if attempt >= self.max_retries:
+            return False
+        if status_code is None or status_code != THROTTLED:
+            if not self.is_idempotent(method, idempotent):
+                return False
+            if status_code is not None and status_code not in self.retry_statuses:
+                return False
+        elif status_code not in self.retry_statuses:
+            return False
+        return self.budget.withdraw()
+
+    def backoff(self, attempt, response=None):
+        """
+        :param attempt: number of retries already made
+        :param response: the failed response, if any
+        :return: seconds to wait before the next attempt
+        """
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    @staticmethod
+    def retry_after(response):
+        """
+        Reads the delay requested by the service, in seconds
+        (retry-after-ms, x-ms-retry-after-ms or Retry-After as seconds or HTTP date)
+        """
+        if response is None or not getattr(response, 'headers', None):
+            return None
+        headers = response.headers
+        for name in ('retry-after-ms', 'x-ms-retry-after-ms'):
+            value = headers.get(name)
+            if value:
+                try:
+                    return max(0.0, float(value) / 1000)
+                except ValueError:
+                    pass
+        value = headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        date = email.utils.parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0.0, email.utils.mktime_tz(date) - time.time())
+
+
+NO_RETRY = RetryPolicy(max_retries=0)
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
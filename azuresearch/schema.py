@@ -0,0 +1,149 @@
+""" Schema diff
+"""
+from collections import namedtuple
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+# field attributes the service lets an existing index change in place
+IN_PLACE_FIELD_ATTRIBUTES = {"retrievable", "searchAnalyzer", "synonymMaps"}
+# index properties which can always be updated in place
+IN_PLACE_INDEX_PROPERTIES = {"scoringProfiles", "defaultScoringProfile", "corsOptions"}
+
+
+class Change(namedtuple("Change", ["path", "kind", "current", "desired", "breaking"])):
+    """
+    One difference between the service's definition and the local one
+    :param path: tuple locating the value, named collection items by name,
+                 e.g. ("fields", "title", "filterable")
+    :param kind: added | removed | changed
+    :param current: value on the service, None if added
+    :param desired: local value, None if removed
+    :param breaking: True if the change requires the resource to be rebuilt
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return "{path} {kind}".format(path=".".join(str(part) for part in self.path),
+                                      kind=self.kind)
+
+
+class SchemaDiff():
+    """
+    Differences between the definition of a resource on the service and its to_dict()
+    :param changes: list of Change
+    :param etag: ETag of the service's definition, to update it conditionally
+    """
+
+    def __init__(self, changes, etag=None):
+        self.changes = changes
+        self.etag = etag
+
+    def __repr__(self):
+        return "<SchemaDiff: {changes}>".format(changes=", ".join(str(c) for c in self.changes))
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    @property
+    def breaking(self):
+        """ changes which cannot be applied in place
+        """
+        return [change for change in self.changes if change.breaking]
+
+    @property
+    def in_place(self):
+        """ True if every change can be applied with an update in place
+        """
+        return not self.breaking
+
+
+def _named(items):
+    if not isinstance(items, list) or not all(isinstance(item, dict) and "name" in item
+                                              for item in items):
+        return None
+    return {item["name"]: item for item in items}
+
+
+def compare(current, desired, path=()):
+    """
+    Lists the differences between two definitions. Only keys present in desired are
+    compared, since the service returns defaults for everything left out. Lists of
+    named objects (fields, suggesters, scoring profiles...) are matched by name, so
+    items missing from desired are reported as removed.
+    :return: list of Change, all marked as not breaking
+    """
+    changes = []
+    if isinstance(current, dict) and isinstance(desired, dict):
+        for key, value in desired.items():
+            if key.startswith("@odata."):
+                continue
+            if (key not in current or current[key] is None) and _named(value):
+                changes.extend(compare([], value, path + (key,)))
+            elif key not in current or current[key] is None:
+                if value not in (None, [], {}):
+                    changes.append(Change(path + (key,), ADDED, None, value, False))
+            else:
+                changes.extend(compare(current[key], value, path + (key,)))
+        return changes
+
+    current_items = _named(current)
+    desired_items = _named(desired)
+    if current_items is not None and desired_items is not None:
+        for name, item in desired_items.items():
+            if name in current_items:
+                changes.extend(compare(current_items[name], item, path + (name,)))
+            else:
+                changes.append(Change(path + (name,), ADDED, None, item, False))
+        for name, item in current_items.items():
+            if name not in desired_items:
+                changes.append(Change(path + (name,), REMOVED, item, None, False))
+        return changes
+
+    if current != desired:
+        changes.append(Change(path, CHANGED, current, desired, False))
+    return changes
+
+
+def classify_index_changes(changes):
+    """
+    Marks the index changes the service cannot apply in place: removing a field or
+    changing most of its attributes, analysis components, and suggesters other than
+    new ones built on new fields. New fields, scoring profiles and CORS options, and the
+    retrievable, searchAnalyzer and synonymMaps attributes can be updated in place.
+    :return: list of Change
+    """
+    new_fields = {change.path[1] for change in changes
+                  if change.path[0] == "fields" and len(change.path) == 2 and
+                  change.kind == ADDED}
+
+    classified = []
+    for change in changes:
+        section = change.path[0]
+        if section in IN_PLACE_INDEX_PROPERTIES:
+            breaking = False
+        elif section == "fields" and len(change.path) <= 2:
+            breaking = change.kind == REMOVED
+        elif section == "fields":
+            breaking = change.path[2] not in IN_PLACE_FIELD_ATTRIBUTES
+        elif section == "suggesters" and len(change.path) == 2 and change.kind == ADDED:
+            breaking = not set(change.desired.get("sourceFields", [])) <= new_fields
+        else:
+            breaking = True
+        classified.append(change._replace(breaking=breaking))
+    return classified
+
+
+def diff(current, desired, classify=None):
+    """
+    Compares the service's definition of a resource with the local one
+    :param current: definition returned by the service (dict)
+    :param desired: local definition (to_dict())
+    :param classify: optional callable marking breaking changes, e.g. classify_index_changes
+    :return: SchemaDiff
+    """
+    changes = compare(current, desired)
+    if classify is not None and changes:
+        changes = classify(changes)
+    return SchemaDiff(changes, etag=current.get("@odata.etag"))
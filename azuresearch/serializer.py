@@ -0,0 +1,81 @@
+""" serializer
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+ACTION_KEY = "@search.action"
+ENVELOPE_START = b'{"value":['
+ENVELOPE_END = b']}'
+ENVELOPE_OVERHEAD = len(ENVELOPE_START) + len(ENVELOPE_END)
+
+
+def dumps(obj):
+    """
+    Serializes obj to compact JSON bytes, with orjson when installed
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """
+    Deserializes JSON bytes or str, with orjson when installed
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class BatchSerializer():
+    """
+    Writes {"value": [...]} index batches in a single join of the encoded documents.
+    The search action is spliced into each encoded document, so the caller's
+    documents are never mutated or copied.
+    :param action: mergeOrUpload | upload | merge | delete
+    """
+
+    def __init__(self, action="mergeOrUpload"):
+        self.action = action
+        self._prefix = b'{"' + ACTION_KEY.encode() + b'":' + dumps(action)
+
+    @staticmethod
+    def encode(document):
+        """
+        Encodes a single document, without the search action
+        :return: JSON bytes
+        """
+        if ACTION_KEY in document:
+            document = {k: v for k, v in document.items() if k != ACTION_KEY}
+        return dumps(document)
+
+    def encoded_size(self, encoded):
+        """
+        :param encoded: a document encoded with encode()
+        :return: bytes the document takes in a batch, including the action and separator
+        """
+        return len(self._prefix) + len(encoded)
+
+    def serialize(self, documents=None, encoded=None):
+        """
+        Serializes a batch
+        :param documents: documents to serialize
+        :param encoded: alternatively, documents already encoded with encode()
+        :return: request body bytes
+        """
+        if encoded is None:
+            encoded = [self.encode(doc) for doc in documents]
+        prefix = self._prefix
+        with_fields = prefix + b","
+        parts = [ENVELOPE_START]
+        for position, doc in enumerate(encoded):
+            if position:
+                parts.append(b",")
+            parts.append(with_fields if len(doc) > 2 else prefix)
+            parts.append(memoryview(doc)[1:])
+        parts.append(ENVELOPE_END)
+        return b"".join(parts)
@@ -1,10 +1,36 @@
 """ service
 """
+import asyncio
 import copy
+import gzip
+import json
 import logging
 import os
+import threading
+import time
+from types import MappingProxyType
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from azuresearch.retry import DEFAULT_RETRY_POLICY
+from azuresearch.serializer import dumps
+from azuresearch.single_flight import SingleFlight, AsyncSingleFlight
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# identical concurrent reads are coalesced across all endpoints of the process
+_SINGLE_FLIGHT = SingleFlight()
+_ASYNC_SINGLE_FLIGHT = AsyncSingleFlight()
 
 
 class MissingEnvironmentVariableError(Exception):
@@ -12,18 +38,142 @@ class MissingEnvironmentVariableError(Exception):
     """
 
 
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS,
+                   pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """
+    Creates a requests.Session with a pooled HTTPS adapter
+    :param pool_connections: number of connection pools to cache
+    :param pool_maxsize: maximum number of connections kept alive per pool
+    :return: a new requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_shared_session(url,
+                       pool_connections=DEFAULT_POOL_CONNECTIONS,
+                       pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """
+    Returns the pooled session shared by all endpoints talking to the same service url.
+    The pool sizes only apply when the session is first created.
+    :param url: Azure Search service url
+    """
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(url)
+        if session is None:
+            session = create_session(pool_connections, pool_maxsize)
+            _SESSIONS[url] = session
+        return session
+
+
+def close_shared_sessions():
+    """
+    Closes all shared sessions and their pooled connections
+    """
+    with _SESSIONS_LOCK:
+        sessions = list(_SESSIONS.values())
+        _SESSIONS.clear()
+    for session in sessions:
+        session.close()
+
+
 class Endpoint():
-    """ Endpoint
+    """
+    Endpoint
+    :param path: service path (e.g. indexes, datasources, skillsets)
+    :param session: an explicit requests.Session to use for every call
+    :param share_session: if True (default), endpoints of the same service url share one
+                          pooled session. Otherwise this endpoint owns a private session
+                          which is released by close()
+    :param pool_connections: number of connection pools to cache
+    :param pool_maxsize: maximum number of connections kept alive per pool
+    :param keep_alive: if False, connections are closed after each request
+    :param retry_policy: RetryPolicy applied to throttled and transient failures.
+                         Defaults to a policy (and retry budget) shared by all endpoints,
+                         use azuresearch.retry.NO_RETRY to disable retries
+    :param compress_threshold: if set, POST and PUT bodies of at least this many bytes
+                               are sent gzip compressed (Content-Encoding: gzip)
+    :param compress_level: gzip compression level, 1 (fastest) to 9 (smallest)
+    :param single_flight: if True (default), concurrent identical reads (GET requests,
+                          searches and suggestions) share one in-flight request. Each
+                          caller receives its own shallow copy of the response: the
+                          attributes are its own, the content and headers are shared
+    :param client: SearchServiceClient providing the service url, keys, api version and
+                   session. Without one they are read from the environment variables
+                   on first use (see refresh)
     """
     api_version = "2019-05-06"
 
-    def __init__(self, path):
+    # pylint: disable=too-many-arguments
+    def __init__(self, path, session=None, share_session=True,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 keep_alive=True,
+                 retry_policy=None,
+                 compress_threshold=None,
+                 compress_level=6,
+                 single_flight=True,
+                 client=None):
         self.path = "/" + path
+        self.client = client
+        if client is not None:
+            self.api_version = client.api_version
+        self.single_flight = single_flight
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.retry_policy = retry_policy if retry_policy is not None else DEFAULT_RETRY_POLICY
+        self.share_session = share_session
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self._session = session
+        self._owns_session = False
+        self._base_url = None
+        self._header_templates = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def session(self):
+        """ session used for all requests of this endpoint
+        """
+        if self._session is None:
+            if self.client is not None:
+                self._session = self.client.session
+            elif self.share_session:
+                self._session = get_shared_session(self._azure_path,
+                                                   self.pool_connections,
+                                                   self.pool_maxsize)
+            else:
+                self._session = create_session(self.pool_connections,
+                                               self.pool_maxsize)
+                self._owns_session = True
+        return self._session
+
+    def close(self):
+        """
+        Releases the session of this endpoint. Private sessions are closed,
+        shared sessions stay open for other endpoints (see close_shared_sessions)
+        """
+        if self._session is not None and self._owns_session:
+            self._session.close()
+        self._session = None
+        self._owns_session = False
 
     @property
     def _azure_path(self):
         """ _azure_path
         """
+        if self.client is not None:
+            return self.client.url
         url = os.environ.get('AZURE_SEARCH_URL', None)
         if url is None:
             raise MissingEnvironmentVariableError(
@@ -34,6 +184,8 @@ class Endpoint():
     def _azure_api_key(self):
         """ _azure_api_key
         """
+        if self.client is not None:
+            return self.client.query_key
         api_key = os.environ.get('AZURE_SEARCH_API_KEY', None)
         if api_key is None:
             raise MissingEnvironmentVariableError(
@@ -44,101 +196,451 @@ class Endpoint():
     def _azure_admin_api_key(self):
         """ _azure_admin_api_key
         """
+        if self.client is not None:
+            return self.client.admin_key
         admin_api_key = os.environ.get('AZURE_SEARCH_ADMIN_API_KEY', None)
         if admin_api_key is None:
             raise MissingEnvironmentVariableError(
                 "The Azure Search admin api-key is required as an environment variable")
         return admin_api_key
 
+    def refresh(self):
+        """
+        Drops the url and header templates, so the url and keys are resolved again
+        (e.g. after the environment variables changed)
+        """
+        self._base_url = None
+        self._header_templates = {}
+
+    def _header_template(self, needs_admin):
+        """
+        The read-only headers of the query or admin key, built once per endpoint
+        """
+        template = self._header_templates.get(needs_admin)
+        if template is None:
+            key = self._azure_admin_api_key if needs_admin else self._azure_api_key
+            headers = {"api-key": key, 'Content-Type': 'application/json'}
+            if not self.keep_alive:
+                headers['Connection'] = 'close'
+            template = MappingProxyType(headers)
+            self._header_templates[needs_admin] = template
+        return template
+
     def query_path(self, endpoint):
         """ query_path
         """
+        base_url = self._base_url
+        if base_url is None:
+            base_url = self._base_url = self._azure_path + self.path
         if endpoint:
-            return self._azure_path + self.path + "/" + endpoint
-        return self._azure_path + self.path
+            return base_url + "/" + endpoint
+        return base_url
 
     def query_args(self, extra=None):
         """ query_args
         """
-        if extra is None:
-            extra = {}
-        extra_copy = copy.deepcopy(extra)
-        extra_copy.update({"api-version": self.api_version})
-        return extra_copy
+        if extra:
+            args = dict(extra)
+            args["api-version"] = self.api_version
+            return args
+        return {"api-version": self.api_version}
 
     def query_headers(self, needs_admin=False, extra=None):
-        """ query_headers
+        """ query_headers, a new dict the caller may change
         """
-        if extra is None:
-            extra = {}
-        extra_copy = copy.deepcopy(extra)
-        if needs_admin:
-            key = self._azure_admin_api_key
-        else:
-            key = self._azure_api_key
-        extra_copy.update({"api-key": key, 'Content-Type': 'application/json'})
-        return extra_copy
+        headers = dict(self._header_template(needs_admin))
+        if extra:
+            headers.update(extra)
+        return headers
 
-    def get(self, data=None, endpoint=None, needs_admin=False):
-        """ get
+    def _payload(self, method, data, body, headers):
         """
-        if data is None:
-            data = {}
-        logging.debug("GET request\n"
-                      "URL: %s."
-                      "Params: %s", self.query_path(endpoint), self.query_args())
-        return requests.get(
-            self.query_path(endpoint),
-            params=self.query_args(),
-            headers=self.query_headers(needs_admin),
-            json=data
-        )
-
-    def post(self, data=None, endpoint=None, needs_admin=False):
-        """ post
+        Builds the request body arguments, gzip compressing large POST and PUT bodies
+        :return: keyword arguments for the session request
         """
         if data is None:
             data = {}
-        logging.debug("POST request\n"
+        if self.compress_threshold is None or method not in ("POST", "PUT"):
+            if body is not None:
+                return {"data": body}
+            return {"json": data}
+        if body is None:
+            body = dumps(data)
+        if len(body) >= self.compress_threshold:
+            body = gzip.compress(body, self.compress_level)
+            headers['Content-Encoding'] = 'gzip'
+        return {"data": body}
+
+    @staticmethod
+    def _flight_key(method, url, params, headers, payload):
+        """ identity of a request, for coalescing identical ones
+        """
+        if "data" in payload:
+            body = payload["data"]
+        else:
+            body = json.dumps(payload["json"], sort_keys=True)
+        return (method, url, json.dumps(params, sort_keys=True),
+                json.dumps(headers, sort_keys=True), body)
+
+    # pylint: disable=too-many-arguments
+    def _request(self, method, data=None, endpoint=None, needs_admin=False,
+                 extra=None, idempotent=None, body=None, coalesce=None, headers=None):
+        url = self.query_path(endpoint)
+        params = self.query_args(extra)
+        headers = self.query_headers(needs_admin, headers)
+        payload = self._payload(method, data, body, headers)
+        logging.debug("%s request\n"
                       "URL: %s."
-                      "Params: %s", self.query_path(endpoint), self.query_args())
+                      "Params: %s", method, url, params)
 
-        return requests.post(
-            self.query_path(endpoint),
-            params=self.query_args(),
-            headers=self.query_headers(needs_admin),
-            json=data
-        )
+        if coalesce is None:
+            coalesce = method == "GET"
+        if coalesce and self.single_flight:
+            key = self._flight_key(method, url, params, headers, payload)
+            return copy.copy(_SINGLE_FLIGHT.do(
+                key, lambda: self._send(method, url, params, headers, payload, idempotent)))
+        return self._send(method, url, params, headers, payload, idempotent)
 
-    def put(self, data=None, endpoint=None, needs_admin=False, extra=None):
-        """ put
+    # pylint: disable=too-many-arguments
+    def _send(self, method, url, params, headers, payload, idempotent):
+        session = self.session
+        policy = self.retry_policy
+        policy.record_request()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = session.request(method, url, params=params,
+                                           headers=headers, **payload)
+            except requests.ConnectionError:
+                if not policy.should_retry(method, attempt, idempotent=idempotent):
+                    raise
+            else:
+                if not policy.should_retry(method, attempt, response.status_code, idempotent):
+                    return response
+            delay = policy.backoff(attempt, response)
+            logging.warning("%s %s failed (%s), retrying in %.2f seconds",
+                            method, url,
+                            response.status_code if response is not None else "connection error",
+                            delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, data=None, endpoint=None, needs_admin=False, headers=None):
+        """ get
+        :param headers: extra request headers, e.g. If-None-Match
         """
-        if data is None:
-            data = {}
-        logging.debug("PUT request\n"
-                      "URL: %s."
-                      "Params: %s", self.query_path(endpoint), self.query_args(extra))
+        return self._request("GET", data, endpoint, needs_admin, headers=headers)
 
-        return requests.put(
-            self.query_path(endpoint),
-            params=self.query_args(extra),
-            headers=self.query_headers(needs_admin),
-            json=data
-        )
+    # pylint: disable=too-many-arguments
+    def post(self, data=None, endpoint=None, needs_admin=False, idempotent=False, body=None,
+             coalesce=False):
+        """ post
+        :param idempotent: True if the request may be retried on transient failures
+                           (e.g. search queries, document index batches)
+        :param body: already serialized JSON bytes, sent instead of data
+        :param coalesce: True if the request is a read which may be shared with
+                         concurrent identical requests (e.g. search queries)
+        """
+        return self._request("POST", data, endpoint, needs_admin,
+                             idempotent=idempotent, body=body, coalesce=coalesce)
+
+    def put(self, data=None, endpoint=None, needs_admin=False, extra=None, headers=None):
+        """ put
+        :param headers: extra request headers, e.g. If-Match
+        """
+        return self._request("PUT", data, endpoint, needs_admin, extra, headers=headers)
 
     def delete(self, data=None, endpoint=None, needs_admin=False):
         """ delete
         """
-        if data is None:
-            data = {}
-        logging.debug("DELETE request\n"
+        return self._request("DELETE", data, endpoint, needs_admin)
+
+
+class SearchServiceClient():
+    """
+    Connection settings of one Azure Search service: url, keys, api version, connection
+    pool and retry policy. Objects bound to a client (client=... or bind()) talk to that
+    service instead of the one configured in the environment, so one process can work
+    with several services.
+    :param url: service url, e.g. https://{name}.search.windows.net
+    :param api_key: query api-key. Queries use the admin key if not given
+    :param admin_api_key: admin api-key
+    :param api_version: REST api version, defaults to Endpoint.api_version
+    :param pool_connections: number of connection pools to cache
+    :param pool_maxsize: maximum number of connections kept alive per pool
+    :param keep_alive: if False, connections are closed after each request
+    :param retry_policy: RetryPolicy of the endpoints of this client
+    :param compress_threshold: see Endpoint
+    :param compress_level: see Endpoint
+    :param single_flight: see Endpoint
+    :param session: an explicit requests.Session. By default the client owns a pooled
+                    session, released by close()
+    """
+
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(self, url, api_key=None, admin_api_key=None, api_version=None,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 keep_alive=True,
+                 retry_policy=None,
+                 compress_threshold=None,
+                 compress_level=6,
+                 single_flight=True,
+                 session=None):
+        if not url:
+            raise ValueError("The Azure Search url is required")
+        if api_key is None and admin_api_key is None:
+            raise ValueError("An api-key or an admin api-key is required")
+        self.url = url.rstrip("/")
+        self.api_key = api_key
+        self.admin_api_key = admin_api_key
+        self.api_version = api_version or Endpoint.api_version
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.retry_policy = retry_policy
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.single_flight = single_flight
+        self._session = session
+        self._owns_session = False
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<SearchServiceClient: {url}>".format(url=self.url)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @classmethod
+    def from_environment(cls, **kwargs):
+        """
+        A client configured from AZURE_SEARCH_URL, AZURE_SEARCH_API_KEY and
+        AZURE_SEARCH_ADMIN_API_KEY, read once
+        :param kwargs: other SearchServiceClient arguments
+        """
+        url = os.environ.get('AZURE_SEARCH_URL', None)
+        if url is None:
+            raise MissingEnvironmentVariableError(
+                "The Azure Search URL is required as an environment variable")
+        return cls(url, api_key=os.environ.get('AZURE_SEARCH_API_KEY', None),
+                   admin_api_key=os.environ.get('AZURE_SEARCH_ADMIN_API_KEY', None), **kwargs)
+
+    @property
+    def query_key(self):
+        """ key used by queries
+        """
+        return self.api_key if self.api_key is not None else self.admin_api_key
+
+    @property
+    def admin_key(self):
+        """ key used by administrative calls
+        """
+        if self.admin_api_key is None:
+            raise MissingEnvironmentVariableError(
+                "No admin api-key configured for {url}".format(url=self.url))
+        return self.admin_api_key
+
+    @property
+    def session(self):
+        """ pooled session shared by every endpoint of this client
+        """
+        with self._lock:
+            if self._session is None:
+                self._session = create_session(self.pool_connections, self.pool_maxsize)
+                self._owns_session = True
+            return self._session
+
+    def endpoint(self, path):
+        """
+        The Endpoint of a service path (e.g. indexes), created once per client
+        """
+        with self._lock:
+            endpoint = self._endpoints.get(path)
+            if endpoint is None:
+                endpoint = Endpoint(path, keep_alive=self.keep_alive,
+                                    retry_policy=self.retry_policy,
+                                    compress_threshold=self.compress_threshold,
+                                    compress_level=self.compress_level,
+                                    single_flight=self.single_flight, client=self)
+                self._endpoints[path] = endpoint
+            return endpoint
+
+    def async_endpoint(self, path):
+        """
+        A new AsyncEndpoint of a service path. Its aiohttp session is bound to the running
+        event loop, so it is owned (and closed) by the caller
+        """
+        return AsyncEndpoint(path, pool_maxsize=self.pool_maxsize, keep_alive=self.keep_alive,
+                             retry_policy=self.retry_policy,
+                             compress_threshold=self.compress_threshold,
+                             compress_level=self.compress_level,
+                             single_flight=self.single_flight, client=self)
+
+    def close(self):
+        """ close the client's session if owned by it
+        """
+        with self._lock:
+            if self._session is not None and self._owns_session:
+                self._session.close()
+            self._session = None
+            self._owns_session = False
+            self._endpoints.clear()
+
+
+class BufferedResponse():
+    """
+    A fully read response, e.g. of an AsyncEndpoint call or served from a cache.
+    Mirrors the parts of requests.Response used across the package
+    (status_code, content, text, headers, json())
+    """
+
+    def __init__(self, status_code, content, headers=None, encoding=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+        self.encoding = encoding
+
+    def __repr__(self):
+        return "<{cls} [{status_code}]>".format(cls=type(self).__name__,
+                                                status_code=self.status_code)
+
+    @property
+    def text(self):
+        """ text
+        """
+        return self.content.decode(self.encoding or "utf-8")
+
+    def json(self):
+        """ json
+        """
+        return json.loads(self.text)
+
+
+class AsyncResponse(BufferedResponse):
+    """
+    A fully read response of an AsyncEndpoint call
+    """
+
+
+class AsyncEndpoint(Endpoint):
+    """
+    asyncio counterpart of Endpoint, backed by a pooled aiohttp.ClientSession.
+    The session is bound to the running event loop, so an AsyncEndpoint must be
+    closed (or used with 'async with') on the loop that created it.
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' with an AsyncEndpoint")
+
+    @property
+    def session(self):
+        """ aiohttp session used for all requests of this endpoint
+        """
+        if self._session is None:
+            if aiohttp is None:
+                raise ImportError("aiohttp is required for the asyncio client. "
+                                  "Install it with 'pip install aiohttp'")
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize,
+                                             force_close=not self.keep_alive)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._owns_session = True
+        return self._session
+
+    async def close(self):
+        """ close the aiohttp session if owned by this endpoint
+        """
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+        self._session = None
+        self._owns_session = False
+
+    def query_args(self, extra=None):
+        """ query_args, as strings (aiohttp does not serialize other types)
+        """
+        args = super().query_args(extra)
+        return {k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in args.items()}
+
+    # pylint: disable=too-many-arguments
+    async def _request(self, method, data=None, endpoint=None, needs_admin=False,
+                       extra=None, idempotent=None, body=None, coalesce=None, headers=None):
+        url = self.query_path(endpoint)
+        params = self.query_args(extra)
+        headers = self.query_headers(needs_admin, headers)
+        payload = self._payload(method, data, body, headers)
+        logging.debug("%s request\n"
                       "URL: %s."
-                      "Params: %s", self.query_path(endpoint),
-                      self.query_args())
-
-        return requests.delete(
-            self.query_path(endpoint),
-            params=self.query_args(),
-            headers=self.query_headers(needs_admin),
-            json=data
-        )
+                      "Params: %s", method, url, params)
+
+        if coalesce is None:
+            coalesce = method == "GET"
+        if coalesce and self.single_flight:
+            key = self._flight_key(method, url, params, headers, payload)
+            return copy.copy(await _ASYNC_SINGLE_FLIGHT.do(
+                key, lambda: self._send(method, url, params, headers, payload, idempotent)))
+        return await self._send(method, url, params, headers, payload, idempotent)
+
+    # pylint: disable=too-many-arguments
+    async def _send(self, method, url, params, headers, payload, idempotent):
+        session = self.session
+        policy = self.retry_policy
+        policy.record_request()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                async with session.request(method, url, params=params,
+                                           headers=headers, **payload) as raw:
+                    content = await raw.read()
+                    response = AsyncResponse(raw.status, content,
+                                             headers=raw.headers,
+                                             encoding=raw.charset)
+            except aiohttp.ClientConnectionError:
+                if not policy.should_retry(method, attempt, idempotent=idempotent):
+                    raise
+            else:
+                if not policy.should_retry(method, attempt, response.status_code, idempotent):
+                    return response
+            delay = policy.backoff(attempt, response)
+            logging.warning("%s %s failed (%s), retrying in %.2f seconds",
+                            method, url,
+                            response.status_code if response is not None else "connection error",
+                            delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get(self, data=None, endpoint=None, needs_admin=False, headers=None):
+        """ get
+        """
+        return await self._request("GET", data, endpoint, needs_admin, headers=headers)
+
+    # pylint: disable=too-many-arguments
+    async def post(self, data=None, endpoint=None, needs_admin=False, idempotent=False,
+                   body=None, coalesce=False):
+        """ post
+        """
+        return await self._request("POST", data, endpoint, needs_admin,
+                                   idempotent=idempotent, body=body, coalesce=coalesce)
+
+    async def put(self, data=None, endpoint=None, needs_admin=False, extra=None,
+                  headers=None):
+        """ put
+        """
+        return await self._request("PUT", data, endpoint, needs_admin, extra,
+                                   headers=headers)
+
+    async def delete(self, data=None, endpoint=None, needs_admin=False):
+        """ delete
+        """
+        return await self._request("DELETE", data, endpoint, needs_admin)
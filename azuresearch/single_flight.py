@@ -0,0 +1,82 @@
+""" single_flight
+"""
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+
+
+class SingleFlight():
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight,
+    other callers with the same key wait for it and receive the same result
+    (or exception) instead of issuing their own call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    def do(self, key, function):
+        """
+        :param key: hashable identity of the call
+        :param function: callable without arguments performing the call
+        :return: the result of function, shared with all concurrent callers of key
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result()
+        try:
+            result = function()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class AsyncSingleFlight():
+    """
+    asyncio counterpart of SingleFlight. Calls are coalesced per event loop.
+    """
+
+    def __init__(self):
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _calls(self):
+        loop = asyncio.get_running_loop()
+        calls = self._loops.get(loop)
+        if calls is None:
+            calls = self._loops[loop] = {}
+        return calls
+
+    async def do(self, key, coroutine_function):
+        """
+        :param key: hashable identity of the call
+        :param coroutine_function: coroutine function without arguments performing the call
+        :return: the result of the call, shared with all concurrent callers of key
+        """
+        calls = self._calls()
+        task = calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_function())
+            calls[key] = task
+
+            def _done(finished):
+                if calls.get(key) is finished:
+                    del calls[key]
+            task.add_done_callback(_done)
+        # a cancelled caller must not cancel the call shared with the others
+        return await asyncio.shield(task)
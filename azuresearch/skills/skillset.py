@@ -42,9 +42,8 @@ class Skillset(BaseApiCall):
                                    }
         }
         return_dict.update(self.params)
-        return_dict = self.to_camel_case_dict(return_dict)
-
-        return_dict = self.remove_empty_values(return_dict)
+        # make all params camelCase and drop empty values (to be sent correctly to Azure Search
+        return_dict = self.to_api_dict(return_dict)
         return return_dict
 
     @classmethod
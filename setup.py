@@ -16,4 +16,5 @@ setup(
     author='Samuel Spencer, Omri Mendels, Elad Iwanir',
     author_email='omri.mendels@microsoft.com',
     description='Python package for calling Azure Search and Azure Cognitive Search',
-    install_requires=REQUIRED)
+    install_requires=REQUIRED,
+    extras_require={'async': ['aiohttp'], 'fast': ['orjson']})
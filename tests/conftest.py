@@ -0,0 +1,15 @@
+import pytest
+
+from azuresearch import service
+
+
+@pytest.fixture
+def azure_env(monkeypatch):
+    """
+    Fake Azure Search configuration for tests running against fake sessions
+    """
+    monkeypatch.setenv("AZURE_SEARCH_URL", "https://test.search.windows.net")
+    monkeypatch.setenv("AZURE_SEARCH_API_KEY", "query-key")
+    monkeypatch.setenv("AZURE_SEARCH_ADMIN_API_KEY", "admin-key")
+    yield
+    service.close_shared_sessions()
@@ -0,0 +1,77 @@
+import pytest
+
+from azuresearch.base_api_call import AzureSearchServiceException
+from azuresearch.cache import ResultCache
+from azuresearch.indexes import Index, IndexAlias, StringField, Suggester
+from azuresearch.indexes.index import next_version_name
+from azuresearch.service import SearchServiceClient
+from tests.test_helpers import FakeSession
+
+pytestmark = pytest.mark.usefixtures("azure_env")
+
+
+def test_next_version_name():
+    assert next_version_name("hotels") == "hotels-v2"
+    assert next_version_name("hotels-v2") == "hotels-v3"
+    assert next_version_name("hotels-v9") == "hotels-v10"
+
+
+def test_next_version_keeps_the_definition():
+    index = Index("hotels-v1", [StringField("id", key=True), StringField("name")])
+    candidate = index.next_version()
+    assert candidate.name == "hotels-v2"
+    assert candidate.endpoint is index.endpoint
+    expected = index.to_dict()
+    expected["name"] = "hotels-v2"
+    assert candidate.to_dict() == expected
+
+    cache = ResultCache()
+    client = SearchServiceClient("https://east.search.windows.net", admin_api_key="key",
+                                 session=FakeSession())
+    index = Index("hotels-v1", [StringField("id", key=True)],
+                  suggesters=[Suggester("sg", ["id"], cache=cache)], cache=cache, client=client)
+    candidate = index.next_version()
+    suggester = candidate.suggesters[0]
+    assert candidate.client is client
+    assert candidate.endpoint is client.endpoint("indexes")
+    assert suggester.endpoint is client.endpoint("indexes")
+    assert suggester.cache is cache
+    assert suggester.cache_namespace == "https://east.search.windows.net/indexes/hotels-v2"
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """ fake index lifecycle: create, delete and count by index name """
+    state = {"created": [], "deleted": [], "counts": {}}
+    monkeypatch.setattr(Index, "create", lambda self: state["created"].append(self.name))
+    monkeypatch.setattr(Index, "delete_if_exists",
+                        lambda self: state["deleted"].append(self.name))
+    monkeypatch.setattr(Index, "count", lambda self: state["counts"].get(self.name, 0))
+    return state
+
+
+def test_rebuild_swaps_once_the_new_version_is_populated(service):
+    live = Index("hotels", [StringField("id", key=True)])
+    alias = IndexAlias(live)
+    service["counts"]["hotels"] = 3
+
+    def populate(index):
+        assert alias.current is live
+        service["counts"][index.name] = 3
+
+    new = alias.rebuild(populate, expected_count=3, retire=True)
+    assert new.name == "hotels-v2"
+    assert alias.current is new
+    assert alias.name == "hotels-v2"
+    assert alias.count() == 3
+    assert service["created"] == ["hotels-v2"]
+    assert service["deleted"] == ["hotels"]
+
+
+def test_failed_rebuild_keeps_the_live_index(service):
+    live = Index("hotels-v4", [StringField("id", key=True)])
+    alias = IndexAlias(live)
+    with pytest.raises(AzureSearchServiceException):
+        alias.rebuild(lambda index: None, timeout=0)
+    assert alias.current is live
+    assert service["deleted"] == ["hotels-v5"]
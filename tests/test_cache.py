@@ -0,0 +1,171 @@
+import json
+
+import pytest
+
+from azuresearch.base_api_call import BaseApiCall
+from azuresearch.cache import ResultCache, DefinitionCache, MISSING
+from azuresearch.indexes import Index, StringField, Suggester
+from azuresearch.service import Endpoint, SearchServiceClient
+from tests.test_helpers import FakeSession, FakeResponse
+
+
+def search_response(keys):
+    return FakeResponse(200, json.dumps({"value": [{"id": key} for key in keys]}).encode())
+
+
+@pytest.mark.usefixtures("azure_env")
+def test_search_and_count_are_cached_until_documents_change():
+    session = FakeSession([search_response(["1"]), FakeResponse(200, b"1"),
+                           FakeResponse(200, b'{"value": []}'),
+                           search_response(["1", "2"])])
+    cache = ResultCache()
+    index = Index("hotels", [StringField("id", key=True)], cache=cache,
+                  endpoint=Endpoint("indexes", session=session))
+
+    assert [hit["id"] for hit in index.search("hotel", top=5)] == ["1"]
+    assert [hit["id"] for hit in index.search("hotel", top=5)] == ["1"]
+    assert index.count() == 1
+    assert index.count() == 1
+    assert len(session.calls) == 2
+    assert cache.stats()["hits"] == 2
+
+    index.documents.add([{"id": "2"}])
+    assert len(cache) == 0
+    assert [hit["id"] for hit in index.search("hotel", top=5)] == ["1", "2"]
+    assert len(session.calls) == 4
+
+
+@pytest.mark.usefixtures("azure_env")
+def test_document_writes_drop_cached_suggestions():
+    suggestions = b'{"value": [{"@search.text": "hotel", "id": "1"}]}'
+    session = FakeSession([FakeResponse(200, suggestions), FakeResponse(200, b'{"value": []}'),
+                           FakeResponse(200, b'{"value": []}')])
+    cache = ResultCache()
+    endpoint = Endpoint("indexes", session=session)
+    suggester = Suggester("sg", ["id"], cache=cache, endpoint=endpoint)
+    index = Index("hotels", [StringField("id", key=True)], suggesters=[suggester],
+                  cache=cache, endpoint=endpoint)
+
+    first = suggester.suggest("ho")
+    second = suggester.suggest("ho")
+    assert second is not first
+    assert second.content == suggestions
+    second.encoding = "latin-1"
+    assert suggester.suggest("ho").encoding is None
+    assert len(session.calls) == 1
+
+    index.documents.add([{"id": "2"}])
+    assert suggester.suggest("ho").json() == {"value": []}
+    assert len(session.calls) == 3
+
+
+def test_cached_results_are_not_shared_across_services():
+    cache = ResultCache()
+    east = SearchServiceClient("https://east.search.windows.net", admin_api_key="key",
+                               session=FakeSession([search_response(["east"])]))
+    west = SearchServiceClient("https://west.search.windows.net", admin_api_key="key",
+                               session=FakeSession([search_response(["west"]),
+                                                    search_response(["west"])]))
+    fields = [StringField("id", key=True)]
+    east_index = Index("hotels", fields, cache=cache, client=east)
+    west_index = Index("hotels", fields, cache=cache, client=west)
+
+    assert [hit["id"] for hit in east_index.search("spa")] == ["east"]
+    assert [hit["id"] for hit in west_index.search("spa")] == ["west"]
+    assert len(cache) == 2
+
+    east_index.bind(west)
+    assert len(cache) == 1
+    assert [hit["id"] for hit in east_index.search("spa")] == ["west"]
+    assert len(west.session.calls) == 1
+
+
+def test_binding_works_without_environment_settings(monkeypatch):
+    for name in ("AZURE_SEARCH_URL", "AZURE_SEARCH_API_KEY", "AZURE_SEARCH_ADMIN_API_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    client = SearchServiceClient("https://east.search.windows.net", admin_api_key="key",
+                                 session=FakeSession([search_response(["1"])]))
+    fields = [StringField("id", key=True)]
+    index = Index("hotels", fields, cache=ResultCache()).bind(client)
+    assert [hit["id"] for hit in index.search("spa")] == ["1"]
+
+    suggester = Suggester("sg", ["id"], cache=ResultCache())
+    Index("hotels", fields, suggesters=[suggester], client=client)
+    assert suggester.cache_namespace == "https://east.search.windows.net/indexes/hotels"
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResultCache(max_entries=2, max_bytes=10)
+    cache.put("index", "search", {"search": "a"}, "a", 4)
+    cache.put("index", "search", {"search": "b"}, "b", 4)
+    assert cache.get("index", "search", {"search": "a"}) == "a"
+    cache.put("index", "search", {"search": "c"}, "c", 4)
+    assert cache.get("index", "search", {"search": "b"}) is MISSING
+    cache.put("index", "search", {"search": "d"}, "d", 8)
+    assert len(cache) == 1
+    assert cache.stats()["bytes"] == 8
+    cache.put("index", "search", {"search": "huge"}, "huge", 11)
+    assert cache.get("index", "search", {"search": "huge"}) is MISSING
+
+
+def test_entries_expire_and_keys_are_normalized(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("azuresearch.cache.time.monotonic", lambda: now[0])
+    cache = ResultCache(ttl=10)
+    cache.put("index", "search", {"search": "a", "top": 5}, "value")
+    assert cache.get("index", "search", {"top": 5, "search": "a"}) == "value"
+    now[0] += 11
+    assert cache.get("index", "search", {"search": "a", "top": 5}) is MISSING
+    assert cache.stats()["expirations"] == 1
+
+
+def test_invalidation_is_scoped_to_the_index():
+    cache = ResultCache()
+    cache.put("hotels", "count", None, 1)
+    cache.put("flights", "count", None, 2)
+    cache.invalidate("hotels")
+    assert cache.get("hotels", "count") is MISSING
+    assert cache.get("flights", "count") == 2
+
+
+@pytest.mark.usefixtures("azure_env")
+def test_definition_cache_revalidates_with_etags(tmpdir):
+    definition = {"name": "hotels", "@odata.etag": '"0x1"',
+                  "fields": [{"name": "id", "type": "Edm.String", "key": True}]}
+    body = json.dumps(definition).encode()
+    cache = DefinitionCache(str(tmpdir))
+    session = FakeSession([FakeResponse(200, body, headers={"ETag": '"0x1"'}),
+                           FakeResponse(304, b"")])
+    index = Index("hotels", [StringField("id", key=True)],
+                  endpoint=Endpoint("indexes", session=session), definition_cache=cache)
+    assert index.get() == body
+    assert "If-None-Match" not in session.calls[0][2]["headers"]
+    assert index.get() == body
+    assert session.calls[1][2]["headers"]["If-None-Match"] == '"0x1"'
+    assert (cache.fetched, cache.revalidated) == (1, 1)
+
+    # a new process starts from the entries on disk
+    warm = DefinitionCache(str(tmpdir))
+    url = index.endpoint.query_path("hotels")
+    assert warm.get(url) == ('"0x1"', body)
+
+    session.responses = [FakeResponse(204)]
+    index.delete()
+    assert cache.get(url) is None
+    assert DefinitionCache(str(tmpdir)).get(url) is None
+
+
+@pytest.mark.usefixtures("azure_env")
+def test_fetch_loads_a_revalidated_definition(monkeypatch):
+    definition = {"name": "hotels", "@odata.etag": '"0x2"',
+                  "fields": [{"name": "id", "type": "Edm.String", "key": True}]}
+    cache = DefinitionCache()
+    monkeypatch.setattr(BaseApiCall, "definition_cache", cache)
+    session = FakeSession([FakeResponse(200, json.dumps(definition).encode()),
+                           FakeResponse(304, b"")])
+    endpoint = Endpoint("indexes", session=session)
+    first = Index.fetch("hotels", endpoint=endpoint)
+    second = Index.fetch("hotels", endpoint=endpoint)
+    assert first.to_dict() == second.to_dict()
+    assert second.key_field.name == "id"
+    assert session.calls[1][2]["headers"]["If-None-Match"] == '"0x2"'
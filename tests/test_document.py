@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+
+import pytest
+
+from azuresearch.document import BulkIndexer, DocumentValidationError
+from azuresearch.indexes import Index, StringField, Int32Field, DoubleField
+from azuresearch.service import Endpoint
+from tests.test_helpers import FakeSession, FakeResponse
+
+pytestmark = pytest.mark.usefixtures("azure_env")
+
+
+def index_response(keys, status_code=200):
+    value = [{"key": key, "status": True, "errorMessage": None, "statusCode": 200} for key in keys]
+    return FakeResponse(status_code, json.dumps({"value": value}).encode())
+
+
+def get_index(session):
+    return Index("hotels", [StringField("id", key=True), Int32Field("rooms")],
+                 endpoint=Endpoint("indexes", session=session))
+
+
+def test_batches_are_cut_by_count_and_size():
+    index = get_index(FakeSession())
+    indexer = BulkIndexer(index.documents, max_batch_size=3, max_batch_bytes=250)
+    docs = ({"id": str(i), "description": "x" * 40} for i in range(7))
+    batches = list(indexer.batches(docs))
+    assert [len(batch) for batch in batches] == [2, 2, 2, 1]
+
+    indexer = BulkIndexer(index.documents, max_batch_size=3)
+    docs = ({"id": str(i)} for i in range(7))
+    assert [len(batch) for batch in indexer.batches(docs)] == [3, 3, 1]
+
+
+def test_bulk_add_aggregates_results_per_key():
+    session = FakeSession([index_response(["0", "1"]), index_response(["2"])])
+    index = get_index(session)
+    result = index.documents.bulk_add(({"id": str(i)} for i in range(3)), max_batch_size=2)
+    assert result.batches == 2
+    assert sorted(result.succeeded) == ["0", "1", "2"]
+    assert not result.failed
+    assert session.calls[0][1].endswith("/indexes/hotels/docs/index")
+
+
+def test_bulk_add_reports_oversized_and_rejected_documents():
+    session = FakeSession([FakeResponse(400, b"bad request")])
+    index = get_index(session)
+    docs = [{"id": "small"}, {"id": "huge", "description": "x" * 500}]
+    result = index.documents.bulk_add(docs, max_batch_bytes=200)
+    assert result.failed["huge"]["statusCode"] == 413
+    assert result.failed["small"]["statusCode"] == 400
+    assert len(session.calls) == 1
+
+
+class EchoIndexSession(FakeSession):
+    """ answers every index batch with a success per document, tracking concurrency """
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.consumed = []
+        self.read_ahead = []
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            # documents drawn from the source but not acknowledged yet
+            acknowledged = sum(len(json.loads(call[2]['data'])['value']) for call in self.calls)
+            self.read_ahead.append(len(self.consumed) - acknowledged)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+            self.calls.append((method, url, kwargs))
+        return index_response([doc["id"] for doc in json.loads(kwargs['data'])['value']])
+
+
+def test_concurrent_bulk_add_bounds_in_flight_batches():
+    session = EchoIndexSession()
+    index = get_index(session)
+
+    def source():
+        for i in range(50):
+            session.consumed.append(i)
+            yield {"id": str(i)}
+
+    result = index.documents.bulk_add(source(), max_batch_size=5, max_workers=3)
+    assert len(result.succeeded) == 50
+    assert result.batches == 10
+    assert sorted(stat.number for stat in result.stats) == list(range(1, 11))
+    assert all(stat.documents == 5 and stat.latency > 0 for stat in result.stats)
+    assert 1 < session.max_in_flight <= 3
+    # the producer stops after max_pending (2 * max_workers) queued batches, one batch
+    # being built and the document closing it
+    assert session.read_ahead[0] < 50
+    assert max(session.read_ahead) <= (2 * 3 + 1) * 5 + 1
+    assert result.documents_per_second > 0
+
+
+def test_only_retriable_failed_keys_are_resubmitted(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda _: None)
+    partial = {"value": [
+        {"key": "0", "status": True, "errorMessage": None, "statusCode": 201},
+        {"key": "1", "status": False, "errorMessage": "conflict", "statusCode": 409},
+        {"key": "2", "status": False, "errorMessage": "invalid", "statusCode": 400},
+        {"key": "3", "status": False, "errorMessage": "busy", "statusCode": 503}]}
+    still_busy = {"value": [
+        {"key": "1", "status": True, "errorMessage": None, "statusCode": 200},
+        {"key": "3", "status": False, "errorMessage": "busy", "statusCode": 503}]}
+    session = FakeSession([FakeResponse(207, json.dumps(partial).encode()),
+                           FakeResponse(207, json.dumps(still_busy).encode()),
+                           index_response(["3"])])
+    index = get_index(session)
+    result = index.documents.bulk_add({"id": str(i)} for i in range(4))
+
+    resent = [[doc["id"] for doc in json.loads(call[2]['data'])['value']] for call in session.calls[1:]]
+    assert resent == [["1", "3"], ["3"]]
+    assert sorted(result.succeeded) == ["0", "1", "3"]
+    assert result.resubmitted == 3
+    assert result.report() == {400: {"count": 1, "keys": ["2"], "errorMessage": "invalid"}}
+
+
+def test_resubmission_stops_after_max_resubmits(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda _: None)
+    busy = {"value": [{"key": "0", "status": False, "errorMessage": "busy", "statusCode": 503}]}
+    session = FakeSession([FakeResponse(207, json.dumps(busy).encode()) for _ in range(5)])
+    index = get_index(session)
+    result = index.documents.bulk_add([{"id": "0"}], max_resubmits=2)
+    assert len(session.calls) == 3
+    assert result.report()[503]["keys"] == ["0"]
+
+
+def test_validator_reports_all_violations_of_a_batch():
+    index = get_index(FakeSession())
+    docs = [{"id": "0", "rooms": 3}, {"id": "1", "rooms": "three"}, {"id": 2, "rooms": 1.5}]
+    with pytest.raises(DocumentValidationError) as error:
+        index.documents.check_documents(docs)
+    violations = error.value.violations
+    assert [(v.position, v.field) for v in violations] == [(1, "rooms"), (2, "id"), (2, "rooms")]
+    assert index.documents.check_document(docs[0])
+
+
+def test_validator_is_rebuilt_when_fields_change():
+    index = get_index(FakeSession())
+    validator = index.validator
+    assert index.validator is validator
+    index.fields.append(DoubleField("rating"))
+    assert index.validator is not validator
+    assert index.validator.types["rating"] is float
+    index.fields = [StringField("id", key=True)]
+    assert "rooms" not in index.validator.types
@@ -0,0 +1,122 @@
+import gzip
+import io
+import json
+import os
+import re
+import threading
+
+import pytest
+
+from azuresearch.indexes import Index, StringField
+from azuresearch.retry import NO_RETRY
+from azuresearch.service import Endpoint
+from tests.test_helpers import FakeSession, FakeResponse
+
+pytestmark = pytest.mark.usefixtures("azure_env")
+
+KEYS = ["k{0:03d}".format(number) for number in range(50)]
+
+
+class KeySpaceSession(FakeSession):
+    """ answers searches over KEYS, honouring key range filters, skip, top and count """
+
+    def __init__(self, fail_after=None):
+        super(KeySpaceSession, self).__init__()
+        self.fail_after = fail_after
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        params = kwargs['json']
+        with self.lock:
+            self.calls.append((method, url, kwargs))
+            if self.fail_after is not None and len(self.calls) > self.fail_after:
+                return FakeResponse(400, b"stop")
+        keys = KEYS
+        for operator, value in re.findall(r"id (gt|le) '([^']*)'", params.get('filter', '')):
+            keys = [key for key in keys if (key > value if operator == "gt" else key <= value)]
+        body = {}
+        if params.get('count'):
+            body['@odata.count'] = len(keys)
+        skip = params.get('skip', 0)
+        top = params.get('top', 50)
+        body['value'] = [{"id": key, "@search.score": 1.0} for key in keys[skip:skip + top]]
+        return FakeResponse(200, json.dumps(body).encode())
+
+
+def get_index(session):
+    return Index("hotels", [StringField("id", key=True, sortable=True)],
+                 endpoint=Endpoint("indexes", session=session, retry_policy=NO_RETRY))
+
+
+def test_export_reads_key_ranges_concurrently_to_gzip(tmpdir):
+    path = str(tmpdir.join("hotels.jsonl.gz"))
+    result = get_index(KeySpaceSession()).export(path, partitions=3, page_size=7)
+    with gzip.open(path, "rt") as export_file:
+        documents = [json.loads(line) for line in export_file]
+    assert sorted(document["id"] for document in documents) == KEYS
+    assert documents[0] == {"id": documents[0]["id"]}
+    assert result.documents == 50
+    assert result.partitions == 3
+    assert not os.path.exists(path + ".checkpoint")
+
+
+def test_export_to_text_stream():
+    stream = io.StringIO()
+    get_index(KeySpaceSession()).export(stream, partitions=2, page_size=10)
+    assert sorted(json.loads(line)["id"] for line in stream.getvalue().splitlines()) == KEYS
+
+
+def test_interrupted_export_resumes_from_checkpoint(tmpdir):
+    path = str(tmpdir.join("hotels.jsonl"))
+    with pytest.raises(Exception):
+        get_index(KeySpaceSession(fail_after=8)).export(path, partitions=2, page_size=5)
+    checkpoint = json.load(open(path + ".checkpoint"))
+    assert any(partition["after"] for partition in checkpoint["partitions"])
+
+    session = KeySpaceSession()
+    get_index(session).export(path, partitions=2, page_size=5)
+    with open(path) as export_file:
+        keys = [json.loads(line)["id"] for line in export_file]
+    assert sorted(keys) == KEYS
+    assert not any(call[2]['json'].get('count') for call in session.calls)
+
+
+class TargetSession(FakeSession):
+    """ accepts every document sent to /docs/index """
+
+    def __init__(self):
+        super(TargetSession, self).__init__()
+        self.indexed = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        documents = json.loads(kwargs['data'])['value']
+        with self.lock:
+            self.calls.append((method, url, kwargs))
+            self.indexed.extend(documents)
+        body = {"value": [{"key": document["id"], "status": True, "statusCode": 201}
+                          for document in documents]}
+        return FakeResponse(200, json.dumps(body).encode())
+
+
+def test_copy_to_bulk_indexes_transformed_documents(tmpdir):
+    target_session = TargetSession()
+    target = Index("hotels-v2", [StringField("id", key=True), StringField("name")],
+                   endpoint=Endpoint("indexes", session=target_session))
+    reports = []
+
+    def transform(document):
+        if document["id"] == "k000":
+            return None
+        return dict(document, name=document["id"].upper())
+
+    result = get_index(KeySpaceSession()).copy_to(target, transform=transform, partitions=2,
+                                                  page_size=10, max_workers=2,
+                                                  progress=reports.append)
+    assert sorted(document["id"] for document in target_session.indexed) == KEYS[1:]
+    assert all(document["@search.action"] == "mergeOrUpload" and
+               document["name"] == document["id"].upper()
+               for document in target_session.indexed)
+    assert len(result.succeeded) == 49
+    assert not result.failed
+    assert reports and reports[-1] is result
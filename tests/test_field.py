@@ -1,5 +1,6 @@
 import pytest
 
+from azuresearch.azure_search_object import AzureSearchObject, camel_case, snake_case
 from azuresearch.indexes import Field, BooleanField, StringField, Int32Field, Int64Field, DoubleField, \
     DateTimeOffsetField, GeographyPointField, CollectionField
 from tests.test_helpers import get_json_file, ordered
@@ -134,3 +135,17 @@ def test_field_creation_equals_json():
     expected = get_json_file("field.json")
 
     assert ordered(actual) == ordered(expected)
+
+
+def test_to_api_dict_camel_cases_keys_and_drops_empty_values():
+    values = {"source_fields": ["a"], "search_mode": "", "max_items": 0, "flag": False,
+              "analyzer": None, "synonym_maps": [], "options": {}}
+    expected = AzureSearchObject.remove_empty_values(AzureSearchObject.to_camel_case_dict(values))
+    assert AzureSearchObject.to_api_dict(values) == expected
+    assert expected == {"sourceFields": ["a"], "maxItems": 0, "flag": False}
+    assert AzureSearchObject.to_snake_case("sourceFields") == "source_fields"
+    snake_case("maxFailedItemsPerBatch")
+    hits = snake_case.cache_info().hits
+    assert snake_case("maxFailedItemsPerBatch") == "max_failed_items_per_batch"
+    assert snake_case.cache_info().hits == hits + 1
+    assert camel_case("max_failed_items_per_batch") == "maxFailedItemsPerBatch"
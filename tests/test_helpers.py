@@ -52,3 +52,74 @@ def serialize(obj):
         return obj_dict
     else:
         return obj.__dict__
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"{}", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeSession:
+    def __init__(self, responses=None):
+        self.calls = []
+        self.responses = list(responses or [])
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        if self.responses:
+            return self.responses.pop(0)
+        return FakeResponse()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncResponse:
+    def __init__(self, status=200, body=b"{}"):
+        self.status = status
+        self.body = body
+        self.headers = {}
+        self.charset = "utf-8"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def read(self):
+        return self.body
+
+
+class FakeAsyncSession:
+    def __init__(self, responses=None):
+        self.calls = []
+        self.responses = list(responses or [])
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        if self.responses:
+            return self.responses.pop(0)
+        return FakeAsyncResponse()
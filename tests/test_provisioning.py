@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from azuresearch.indexers import Indexer
+from azuresearch.provisioning import ProvisioningPlan, CREATED, UPDATED, UNCHANGED
+from azuresearch.schema import SchemaDiff, Change
+
+pytestmark = pytest.mark.usefixtures("azure_env")
+
+
+class FakeResource():
+    """ records create/update/delete calls; state is None (missing), 'same' or 'changed' """
+    log = []
+    lock = threading.Lock()
+
+    def __init__(self, service_name, name, state=None, depends_on=(), fail=False):
+        self.service_name = service_name
+        self.name = name
+        self.state = state
+        self.depends_on = list(depends_on)
+        self.fail = fail
+
+    def _record(self, action):
+        time.sleep(0.01)
+        with FakeResource.lock:
+            FakeResource.log.append((action, self.name))
+
+    def dependencies(self):
+        return self.depends_on
+
+    def diff(self):
+        if self.state is None:
+            return None
+        if self.state == "same":
+            return SchemaDiff([])
+        return SchemaDiff([Change(("fields", "x"), "added", None, {}, False)])
+
+    def create(self):
+        if self.fail:
+            raise RuntimeError("boom")
+        self._record("create")
+
+    def update(self, allow_rebuild=False, changes=None):
+        assert changes
+        self._record("update")
+
+    def delete_if_exists(self):
+        self._record("delete")
+
+
+@pytest.fixture
+def tenant():
+    FakeResource.log = []
+    deps = [("datasources", "ds"), ("indexes", "idx"), ("skillsets", "sk")]
+    return [FakeResource("indexers", "ixr", depends_on=deps),
+            FakeResource("datasources", "ds"),
+            FakeResource("indexes", "idx", state="changed"),
+            FakeResource("skillsets", "sk", state="same")]
+
+
+def test_indexer_dependencies():
+    indexer = Indexer("ixr", data_source_name="ds", target_index_name="idx", skillset_name=None)
+    assert indexer.dependencies() == [("datasources", "ds"), ("indexes", "idx")]
+
+
+def test_plan_applies_dependencies_first(tenant):
+    plan = ProvisioningPlan(tenant, max_workers=4)
+    assert plan.levels()[-1] == [("indexers", "ixr")]
+    result = plan.run()
+    assert result.ok
+    assert result.applied[("datasources", "ds")] == CREATED
+    assert result.applied[("indexes", "idx")] == UPDATED
+    assert result.applied[("skillsets", "sk")] == UNCHANGED
+    assert list(result.applied)[-1] == ("indexers", "ixr")
+    assert FakeResource.log[-1] == ("create", "ixr")
+
+
+def test_failure_skips_dependents_and_rolls_back(tenant):
+    tenant[2].state = None
+    tenant[3].fail = True
+    tenant[3].state = None
+    result = ProvisioningPlan(tenant, max_workers=4).run(rollback=True)
+    assert not result.ok
+    assert list(result.failed) == [("skillsets", "sk")]
+    assert result.skipped == [("indexers", "ixr")]
+    assert sorted(result.rolled_back) == [("datasources", "ds"), ("indexes", "idx")]
+    assert ("create", "ixr") not in FakeResource.log
+
+
+def test_cycles_are_rejected():
+    first = FakeResource("indexes", "a", depends_on=[("indexes", "b")])
+    second = FakeResource("indexes", "b", depends_on=[("indexes", "a")])
+    with pytest.raises(ValueError):
+        ProvisioningPlan([first, second])
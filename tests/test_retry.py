@@ -0,0 +1,83 @@
+import pytest
+import requests
+
+from azuresearch import service
+from azuresearch.retry import RetryPolicy, RetryBudget
+from azuresearch.service import Endpoint
+from tests.test_helpers import FakeSession, FakeResponse
+
+
+pytestmark = pytest.mark.usefixtures("azure_env")
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(service.time, "sleep", delays.append)
+    return delays
+
+
+def test_throttled_get_is_retried_honoring_retry_after(sleeps):
+    session = FakeSession([FakeResponse(429, headers={'Retry-After': '2'}),
+                           FakeResponse(503),
+                           FakeResponse(200)])
+    endpoint = Endpoint("indexes", session=session,
+                        retry_policy=RetryPolicy(jitter=False, backoff_factor=1))
+    assert endpoint.get(endpoint="my-index").status_code == 200
+    assert len(session.calls) == 3
+    assert sleeps == [2.0, 2]
+
+
+def test_non_idempotent_post_is_only_retried_when_throttled(sleeps):
+    session = FakeSession([FakeResponse(503), FakeResponse(200)])
+    endpoint = Endpoint("indexes", session=session, retry_policy=RetryPolicy())
+    assert endpoint.post().status_code == 503
+
+    session = FakeSession([FakeResponse(429), FakeResponse(201)])
+    endpoint = Endpoint("indexes", session=session, retry_policy=RetryPolicy())
+    assert endpoint.post().status_code == 201
+
+
+def test_idempotent_post_is_retried(sleeps):
+    session = FakeSession([FakeResponse(503), FakeResponse(200)])
+    endpoint = Endpoint("indexes", session=session, retry_policy=RetryPolicy())
+    assert endpoint.post(endpoint="my-index/docs/search", idempotent=True).status_code == 200
+
+
+def test_retries_stop_after_max_retries(sleeps):
+    session = FakeSession([FakeResponse(429)] * 5)
+    endpoint = Endpoint("indexes", session=session,
+                        retry_policy=RetryPolicy(max_retries=2))
+    assert endpoint.get().status_code == 429
+    assert len(session.calls) == 3
+
+
+def test_connection_errors_are_retried_for_idempotent_requests(sleeps):
+    class FlakySession(FakeSession):
+        def request(self, method, url, **kwargs):
+            if not self.calls:
+                self.calls.append((method, url, kwargs))
+                raise requests.ConnectionError()
+            return super().request(method, url, **kwargs)
+
+    endpoint = Endpoint("indexes", session=FlakySession(), retry_policy=RetryPolicy())
+    assert endpoint.get().status_code == 200
+
+    endpoint = Endpoint("indexes", session=FlakySession(), retry_policy=RetryPolicy())
+    with pytest.raises(requests.ConnectionError):
+        endpoint.post()
+
+
+def test_retry_budget_limits_retries(sleeps):
+    policy = RetryPolicy(budget=RetryBudget(ratio=0, min_tokens=1))
+    session = FakeSession([FakeResponse(429)] * 5)
+    endpoint = Endpoint("indexes", session=session, retry_policy=policy)
+    assert endpoint.get().status_code == 429
+    assert len(session.calls) == 2
+
+
+def test_backoff_is_exponential_and_capped():
+    policy = RetryPolicy(backoff_factor=1, max_backoff=5, jitter=False)
+    assert [policy.backoff(attempt) for attempt in range(5)] == [1, 2, 4, 5, 5]
+    policy = RetryPolicy(backoff_factor=1, max_backoff=5)
+    assert all(0 <= policy.backoff(attempt) <= 5 for attempt in range(5))
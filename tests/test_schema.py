@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from azuresearch.base_api_call import AzureSearchServiceException
+from azuresearch.indexes import Index, StringField, Suggester
+from azuresearch.schema import diff, classify_index_changes, ADDED, REMOVED, CHANGED
+from azuresearch.service import Endpoint
+from tests.test_helpers import FakeSession, FakeResponse
+
+pytestmark = pytest.mark.usefixtures("azure_env")
+
+
+def server_definition(index, **overrides):
+    definition = index.to_dict()
+    definition["@odata.etag"] = '"0x8D1"'
+    definition["@odata.context"] = "https://example/$metadata#indexes/$entity"
+    for field in definition["fields"]:
+        field.setdefault("analyzer", None)
+        field.setdefault("synonymMaps", [])
+    definition.update(overrides)
+    return definition
+
+
+def get_index(session, fields):
+    return Index("hotels", fields, endpoint=Endpoint("indexes", session=session))
+
+
+def test_diff_ignores_server_defaults():
+    index = get_index(FakeSession(), [StringField("id", key=True)])
+    changes = diff(server_definition(index), index.to_dict(), classify_index_changes)
+    assert not changes
+    assert changes.etag == '"0x8D1"'
+
+
+def test_classify_index_changes():
+    current = {"fields": [{"name": "id", "key": True},
+                          {"name": "title", "filterable": False, "retrievable": True},
+                          {"name": "old"}]}
+    desired = {"fields": [{"name": "id", "key": True},
+                          {"name": "title", "filterable": True, "retrievable": False},
+                          {"name": "city"}],
+               "suggesters": [{"name": "sg", "sourceFields": ["city"]}],
+               "corsOptions": {"allowedOrigins": ["*"]}}
+    changes = {str(change): change for change in
+               diff(current, desired, classify_index_changes).changes}
+    assert changes["fields.city added"].kind == ADDED
+    assert not changes["fields.city added"].breaking
+    assert not changes["fields.title.retrievable changed"].breaking
+    assert changes["fields.title.filterable changed"].kind == CHANGED
+    assert changes["fields.title.filterable changed"].breaking
+    assert changes["fields.old removed"].kind == REMOVED
+    assert changes["fields.old removed"].breaking
+    assert not changes["suggesters.sg added"].breaking
+    assert not changes["corsOptions added"].breaking
+
+
+def test_update_puts_in_place_changes_with_if_match():
+    old = get_index(FakeSession(), [StringField("id", key=True)])
+    session = FakeSession([FakeResponse(200, json.dumps(server_definition(old)).encode()),
+                           FakeResponse(204)])
+    index = get_index(session, [StringField("id", key=True), StringField("city")])
+    index.update()
+    (get_method, _, _), (put_method, put_url, put_kwargs) = session.calls
+    assert (get_method, put_method) == ("GET", "PUT")
+    assert put_url.endswith("/indexes/hotels")
+    assert put_kwargs["headers"]["If-Match"] == '"0x8D1"'
+    assert [field["name"] for field in put_kwargs["json"]["fields"]] == ["id", "city"]
+
+
+def test_update_rebuilds_only_breaking_changes():
+    old = get_index(FakeSession(), [StringField("id", key=True), StringField("city")])
+    body = json.dumps(server_definition(old)).encode()
+    index = get_index(FakeSession([FakeResponse(200, body)]),
+                      [StringField("id", key=True), StringField("city", sortable=True)])
+    with pytest.raises(AzureSearchServiceException):
+        index.update(allow_rebuild=False)
+
+    session = FakeSession([FakeResponse(200, body), FakeResponse(204), FakeResponse(201)])
+    index.endpoint = Endpoint("indexes", session=session)
+    index.update()
+    assert [call[0] for call in session.calls] == ["GET", "DELETE", "POST"]
+
+
+def test_update_creates_missing_resources_and_skips_unchanged_ones():
+    session = FakeSession([FakeResponse(404), FakeResponse(201)])
+    index = get_index(session, [StringField("id", key=True)])
+    index.update()
+    assert [call[0] for call in session.calls] == ["GET", "POST"]
+
+    session = FakeSession([FakeResponse(200, json.dumps(server_definition(index)).encode())])
+    index.endpoint = Endpoint("indexes", session=session)
+    assert index.update() is None
+    assert len(session.calls) == 1
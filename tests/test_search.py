@@ -0,0 +1,223 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from azuresearch.base_api_call import AzureSearchServiceException
+from azuresearch.indexes import search_results, Index, StringField, SearchResults
+from azuresearch.retry import NO_RETRY
+from azuresearch.service import Endpoint, AsyncEndpoint
+from tests.test_helpers import FakeSession, FakeResponse, FakeAsyncSession, FakeAsyncResponse
+
+pytestmark = pytest.mark.usefixtures("azure_env")
+
+
+def page(keys, **extra):
+    body = {"value": [{"id": key, "@search.score": 1.0} for key in keys]}
+    body.update(extra)
+    return FakeResponse(200, json.dumps(body).encode())
+
+
+def get_index(session):
+    return Index("hotels", [StringField("id", key=True)],
+                 endpoint=Endpoint("indexes", session=session))
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_search_follows_next_page_parameters(prefetch):
+    next_params = {"search": "hotel", "skip": 2, "top": 2}
+    session = FakeSession([page(["1", "2"], **{"@search.nextPageParameters": next_params}),
+                           page(["3"])])
+    index = get_index(session)
+    assert [doc["id"] for doc in index.iter_search("hotel", prefetch=prefetch)] == ["1", "2", "3"]
+    assert session.calls[1][2]['json'] == next_params
+
+
+def test_iter_search_pages_with_skip_and_stops_at_max_results():
+    session = FakeSession([page(["1", "2"]), page(["3", "4"]), page(["5", "6"])])
+    index = get_index(session)
+    docs = list(index.iter_search("hotel", page_size=2, max_results=3))
+    assert [doc["id"] for doc in docs] == ["1", "2", "3"]
+    assert [call[2]['json'].get('skip') for call in session.calls] == [None, 2]
+
+
+def test_iter_search_raises_on_error():
+    index = get_index(FakeSession([FakeResponse(400, b"bad query")]))
+    with pytest.raises(AzureSearchServiceException):
+        list(index.iter_search("hotel"))
+
+
+def test_search_returns_immutable_results():
+    next_params = {"search": "hotel", "skip": 1}
+    session = FakeSession([page(["1"], **{"@odata.count": 2,
+                                          "@search.facets": {"city": [{"value": "Paris", "count": 2}]},
+                                          "@search.nextPageParameters": next_params}),
+                           page(["2"], **{"@odata.count": 2})])
+    index = get_index(session)
+    results = index.search("hotel")
+    assert isinstance(results, SearchResults)
+    assert [doc["id"] for doc in results] == ["1"]
+    assert results.count == 2
+    assert results.facets["city"][0]["value"] == "Paris"
+    with pytest.raises(AttributeError):
+        results.count = 3
+    with pytest.raises(TypeError):
+        results.facets["city"] = []
+    assert not hasattr(index, "results")
+
+    following = index.next_page(results)
+    assert session.calls[1][2]['json'] == next_params
+    assert [doc["id"] for doc in following] == ["2"]
+    assert index.next_page(following) is None
+
+
+def test_search_raises_on_error():
+    index = get_index(FakeSession([FakeResponse(503, b"unavailable")]))
+    index.endpoint.retry_policy = NO_RETRY
+    with pytest.raises(AzureSearchServiceException):
+        index.search("hotel")
+
+
+def test_search_results_read_metadata_without_decoding_documents(monkeypatch):
+    raw = json.dumps({
+        "@odata.count": 3,
+        "@search.facets": {"city": [{"value": "Paris", "count": 3}]},
+        "value": [{"@search.score": 2.5, "id": "1", "description": "say \"@odata.count\": 9"},
+                  {"@search.score": 1.5, "id": "2", "@search.highlights": {"description": ["x"]}}],
+        "@search.nextPageParameters": {"skip": 2}}).encode()
+    results = SearchResults(raw)
+
+    def fail(_):
+        raise AssertionError("documents were decoded")
+    monkeypatch.setattr(search_results, "loads", fail)
+    assert results.count == 3
+    assert results.facets["city"][0]["count"] == 3
+    assert results.scores == [2.5, 1.5]
+    assert dict(results.continuation) == {"skip": 2}
+
+    monkeypatch.undo()
+    hits = results.hits
+    assert [hit.score for hit in hits] == [2.5, 1.5]
+    assert hits[1].highlights == {"description": ["x"]}
+    assert hits[0].document == {"id": "1", "description": 'say "@odata.count": 9'}
+    assert not hasattr(hits[0], "__dict__")
+    assert results.json()["value"][0]["@search.score"] == 2.5
+
+
+class QuerySession(FakeSession):
+    """ answers each search with a document named after the query, failing on 'bad' """
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        time.sleep(0.01)
+        search = kwargs['json']['search'].strip('"')
+        if search == "bad":
+            return FakeResponse(400, b"bad query")
+        return page([search])
+
+
+def test_search_many_preserves_order_and_isolates_errors():
+    session = QuerySession()
+    index = get_index(session)
+    queries = ["a", {"query": "b", "top": 1}, "bad", "d"]
+    outcomes = index.search_many(queries, max_concurrency=4)
+    assert [outcome.query for outcome in outcomes] == queries
+    assert [outcome.ok for outcome in outcomes] == [True, True, False, True]
+    assert [outcome.results[0]["id"] for outcome in outcomes if outcome.ok] == ["a", "b", "d"]
+    assert isinstance(outcomes[2].error, AzureSearchServiceException)
+    assert all(outcome.latency > 0 for outcome in outcomes)
+    assert index.search_many([]) == []
+
+
+def test_asearch_many_preserves_order_and_isolates_errors():
+    session = FakeAsyncSession([FakeAsyncResponse(200, b'{"value": [{"id": "a"}]}'),
+                                FakeAsyncResponse(400, b'bad query')])
+    index = Index("hotels", [StringField("id", key=True)],
+                  async_endpoint=AsyncEndpoint("indexes", session=session))
+    outcomes = asyncio.run(index.asearch_many(["a", "bad"], max_concurrency=1))
+    assert outcomes[0].results[0]["id"] == "a"
+    assert isinstance(outcomes[1].error, AzureSearchServiceException)
+
+
+def test_malformed_queries_fail_alone():
+    queries = ["a", {"top": 1}, "d"]
+    outcomes = get_index(QuerySession()).search_many(queries)
+    assert [outcome.ok for outcome in outcomes] == [True, False, True]
+    assert isinstance(outcomes[1].error, KeyError)
+
+    session = FakeAsyncSession([FakeAsyncResponse(200, b'{"value": [{"id": "a"}]}'),
+                                FakeAsyncResponse(200, b'{"value": [{"id": "d"}]}')])
+    index = Index("hotels", [StringField("id", key=True)],
+                  async_endpoint=AsyncEndpoint("indexes", session=session))
+    outcomes = asyncio.run(index.asearch_many(queries, max_concurrency=1))
+    assert [outcome.ok for outcome in outcomes] == [True, False, True]
+    assert [outcome.results[0]["id"] for outcome in outcomes if outcome.ok] == ["a", "d"]
+    assert isinstance(outcomes[1].error, KeyError)
+
+
+def test_cursor_pages_on_the_last_key_and_resumes_from_token():
+    session = FakeSession([page(["a", "b"]), page(["c", "d"]), page(["o'k"])])
+    index = Index("hotels", [StringField("id", key=True, sortable=True)],
+                  endpoint=Endpoint("indexes", session=session))
+    cursor = index.cursor(page_size=2, filter="rating gt 3")
+    assert [doc["id"] for doc in cursor.next_page()] == ["a", "b"]
+
+    resumed = index.cursor(token=cursor.token)
+    assert [doc["id"] for doc in resumed] == ["c", "d", "o'k"]
+    filters = [call[2]['json'].get('filter') for call in session.calls]
+    assert filters == ["(rating gt 3)", "(rating gt 3) and id gt 'b'", "(rating gt 3) and id gt 'd'"]
+    assert session.calls[0][2]['json']['orderby'] == "id asc"
+    assert resumed.exhausted
+    assert resumed.next_page() == []
+    assert len(session.calls) == 3
+
+
+class CappedSession(FakeSession):
+    """ serves keys 0..total-1 in pages of at most 1000, like the service
+    """
+
+    def __init__(self, total):
+        super().__init__()
+        self.keys = ["{0:05d}".format(i) for i in range(total)]
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        params = kwargs['json']
+        after = params.get('filter', "").rpartition("gt '")[2].rstrip("'")
+        matching = [key for key in self.keys if key > after]
+        extra = {}
+        if len(matching) > 1000 and params['top'] > 1000:
+            extra["@search.nextPageParameters"] = dict(params, skip=1000, top=params['top'] - 1000)
+        return page(matching[:min(params['top'], 1000)], **extra)
+
+
+def test_cursor_pages_past_the_service_page_cap():
+    session = CappedSession(2500)
+    index = Index("hotels", [StringField("id", key=True, sortable=True)],
+                  endpoint=Endpoint("indexes", session=session))
+    documents = list(index.cursor(page_size=2000))
+    assert [doc["id"] for doc in documents] == session.keys
+    assert len(session.calls) == 3
+
+
+def test_cursor_requires_a_sortable_key():
+    with pytest.raises(ValueError):
+        get_index(FakeSession()).cursor()
+
+
+def test_search_results_keep_the_response_status_and_content():
+    body = b'{"value": [{"id": "1", "@search.score": 1.0}]}'
+    index = get_index(FakeSession([FakeResponse(200, body)]))
+    results = index.search("hotel")
+    assert results.status_code == 200
+    assert results.content == body
+    assert json.loads(SearchResults({"value": []}).content) == {"value": []}
+
+
+def test_scores_read_every_json_number_form():
+    raw = (b'{"value": [{"id": "1", "@search.score": 1.5e-05}, '
+           b'{"id": "2", "@search.score": -2.5}, {"id": "3", "@search.score": 3E+2}, '
+           b'{"id": "4", "@search.score": 7}]}')
+    assert SearchResults(raw).scores == [1.5e-05, -2.5, 300.0, 7.0]
+    assert SearchResults(raw).scores == [hit.score for hit in SearchResults(raw).hits]
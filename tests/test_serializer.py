@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from azuresearch import serializer
+from azuresearch.serializer import BatchSerializer
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(serializer, "orjson", None)
+    elif serializer.orjson is None:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def test_batch_is_serialized_without_mutating_documents(backend):
+    docs = [{"id": "1", "tags": ["a", "b"]}, {}, {"id": "é", "@search.action": "upload"}]
+    body = BatchSerializer("delete").serialize(docs)
+    assert json.loads(body) == {"value": [
+        {"@search.action": "delete", "id": "1", "tags": ["a", "b"]},
+        {"@search.action": "delete"},
+        {"@search.action": "delete", "id": "é"}]}
+    assert docs == [{"id": "1", "tags": ["a", "b"]}, {}, {"id": "é", "@search.action": "upload"}]
+
+
+def test_encoded_size_matches_serialized_size(backend):
+    batch_serializer = BatchSerializer()
+    docs = [{"id": str(i), "text": "x" * i} for i in range(5)]
+    encoded = [batch_serializer.encode(doc) for doc in docs]
+    body = batch_serializer.serialize(encoded=encoded)
+    expected = serializer.ENVELOPE_OVERHEAD + len(docs) - 1 + \
+        sum(batch_serializer.encoded_size(enc) for enc in encoded)
+    assert len(body) == expected
+    assert batch_serializer.serialize(docs[:1]) == batch_serializer.serialize(encoded=encoded[:1])
@@ -0,0 +1,143 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from azuresearch.indexes import Index, StringField, Suggester
+from azuresearch.service import Endpoint, AsyncEndpoint, SearchServiceClient, \
+    MissingEnvironmentVariableError
+from tests.test_helpers import FakeSession, FakeAsyncSession, FakeAsyncResponse
+
+
+pytestmark = pytest.mark.usefixtures("azure_env")
+
+
+def test_endpoints_share_session_per_service_url():
+    first = Endpoint("indexes")
+    second = Endpoint("datasources")
+    assert first.session is second.session
+
+
+def test_private_session_is_closed_by_context_manager():
+    with Endpoint("indexes", share_session=False) as endpoint:
+        session = endpoint.session
+        assert session is not Endpoint("indexes").session
+    assert endpoint._session is None
+
+
+def test_explicit_session_is_used_for_requests():
+    session = FakeSession()
+    endpoint = Endpoint("indexes", session=session)
+    endpoint.get(endpoint="my-index", needs_admin=True)
+    method, url, kwargs = session.calls[0]
+    assert method == "GET"
+    assert url == "https://test.search.windows.net/indexes/my-index"
+    assert kwargs['headers']['api-key'] == "admin-key"
+    endpoint.close()
+    assert not session.closed
+
+
+def test_keep_alive_disabled_closes_connection():
+    session = FakeSession()
+    endpoint = Endpoint("indexes", session=session, keep_alive=False)
+    endpoint.post(endpoint="my-index/docs/search")
+    assert session.calls[0][2]['headers']['Connection'] == 'close'
+
+
+def test_async_endpoint_reads_response():
+    session = FakeAsyncSession([FakeAsyncResponse(200, b'{"value": [1, 2]}')])
+    endpoint = AsyncEndpoint("indexes", session=session)
+    response = asyncio.run(endpoint.post(endpoint="my-index/docs/search"))
+    assert response.status_code == 200
+    assert response.json() == {"value": [1, 2]}
+    method, url, kwargs = session.calls[0]
+    assert method == "POST"
+    assert kwargs['params'] == {"api-version": Endpoint.api_version}
+    assert kwargs['headers']['api-key'] == "query-key"
+
+
+def test_async_count_shares_sync_parsing():
+    session = FakeAsyncSession([FakeAsyncResponse(200, b'\xef\xbb\xbf42')])
+    index = Index("my-index", [StringField("id", key=True)],
+                  async_endpoint=AsyncEndpoint("indexes", session=session))
+    assert asyncio.run(index.acount()) == 42
+    assert session.calls[0][1].endswith("/indexes/my-index/docs/$count")
+
+
+def test_large_bodies_are_gzip_compressed():
+    session = FakeSession()
+    endpoint = Endpoint("indexes", session=session, compress_threshold=100, compress_level=1)
+    endpoint.post(body=b'{"value":[' + b'{"id":"1"},' * 50 + b'{}]}')
+    endpoint.post(data={"search": "small"})
+    endpoint.get(data={"analyzer": "standard", "text": "x" * 200})
+
+    large, small, get = session.calls
+    assert large[2]['headers']['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(large[2]['data']))['value'][0] == {"id": "1"}
+    assert 'Content-Encoding' not in small[2]['headers']
+    assert json.loads(small[2]['data']) == {"search": "small"}
+    assert 'Content-Encoding' not in get[2]['headers']
+
+    client = SearchServiceClient("https://east.search.windows.net", admin_api_key="key",
+                                 compress_threshold=100, compress_level=9, session=FakeSession())
+    assert client.endpoint("indexes").compress_level == 9
+    assert client.async_endpoint("indexes").compress_level == 9
+    assert get[2]['json']['analyzer'] == "standard"
+
+
+def test_client_binds_objects_to_its_service(monkeypatch):
+    for name in ("AZURE_SEARCH_URL", "AZURE_SEARCH_API_KEY", "AZURE_SEARCH_ADMIN_API_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    east = SearchServiceClient("https://east.search.windows.net/", api_key="east-query",
+                               admin_api_key="east-admin", session=FakeSession())
+    west = SearchServiceClient("https://west.search.windows.net", admin_api_key="west-admin",
+                               api_version="2020-06-30", session=FakeSession())
+    index = Index("hotels", [StringField("id", key=True)],
+                  suggesters=[Suggester("sg", ["id"])], client=east)
+    assert index.suggesters[0].endpoint is east.endpoint("indexes")
+
+    index.search("spa")
+    index.documents.add([{"id": "1"}])
+    (_, search_url, search), (_, add_url, add) = east.session.calls
+    assert search_url.startswith("https://east.search.windows.net/indexes/hotels/docs/search")
+    assert search["headers"]["api-key"] == "east-query"
+    assert add["headers"]["api-key"] == "east-admin"
+    assert add_url.endswith("/indexes/hotels/docs/index")
+
+    index.bind(west)
+    index.suggesters[0].suggest("sp")
+    (_, url, kwargs), = west.session.calls
+    assert url.startswith("https://west.search.windows.net/indexes/sg")
+    assert kwargs["headers"]["api-key"] == "west-admin"
+    assert kwargs["params"]["api-version"] == "2020-06-30"
+    assert len(east.session.calls) == 2
+
+
+def test_client_from_environment_reads_the_environment_once(monkeypatch):
+    monkeypatch.setenv("AZURE_SEARCH_URL", "https://env.search.windows.net")
+    monkeypatch.setenv("AZURE_SEARCH_API_KEY", "query-key")
+    monkeypatch.delenv("AZURE_SEARCH_ADMIN_API_KEY", raising=False)
+    client = SearchServiceClient.from_environment()
+    monkeypatch.setenv("AZURE_SEARCH_URL", "https://other.search.windows.net")
+    endpoint = client.endpoint("indexes")
+    assert endpoint.query_path("hotels") == "https://env.search.windows.net/indexes/hotels"
+    with pytest.raises(MissingEnvironmentVariableError):
+        endpoint.query_headers(needs_admin=True)
+
+
+def test_endpoint_resolves_url_and_headers_once(monkeypatch):
+    endpoint = Endpoint("indexes", session=FakeSession())
+    headers = endpoint.query_headers(needs_admin=True, extra={"If-Match": "*"})
+    headers["Content-Encoding"] = "gzip"
+    assert endpoint.query_headers(needs_admin=True) == {
+        "api-key": "admin-key", "Content-Type": "application/json"}
+    assert endpoint.query_args({"top": 1}) == {"top": 1, "api-version": endpoint.api_version}
+
+    calls = []
+    monkeypatch.setattr(Endpoint, "_azure_path",
+                        property(lambda self: calls.append("url") or "https://x.net"))
+    endpoint.refresh()
+    for _ in range(3):
+        endpoint.query_path("hotels")
+    assert calls == ["url"]
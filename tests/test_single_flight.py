@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from azuresearch.service import Endpoint, AsyncEndpoint
+from azuresearch.single_flight import SingleFlight
+from tests.test_helpers import FakeSession, FakeAsyncSession, FakeAsyncResponse
+
+pytestmark = pytest.mark.usefixtures("azure_env")
+
+
+@pytest.fixture(name="joined")
+def joined_fixture(monkeypatch):
+    """ semaphore released whenever a caller starts waiting for an in-flight call
+    """
+    joined = threading.Semaphore(0)
+
+    class JoinedFuture(Future):
+        def result(self, timeout=None):
+            joined.release()
+            return super().result(timeout)
+
+    monkeypatch.setattr("azuresearch.single_flight.Future", JoinedFuture)
+    return joined
+
+
+class GatedSession(FakeSession):
+    """ holds every request until `followers` callers joined it, or `parties` requests
+    are in flight together
+    """
+
+    def __init__(self, joined=None, followers=0, parties=1):
+        super().__init__()
+        self.joined = joined
+        self.followers = followers
+        self.barrier = threading.Barrier(parties, timeout=5)
+
+    def request(self, method, url, **kwargs):
+        for _ in range(self.followers):
+            assert self.joined.acquire(timeout=5)
+        self.barrier.wait()
+        return super().request(method, url, **kwargs)
+
+
+class SlowAsyncSession(FakeAsyncSession):
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        return SlowAsyncResponse()
+
+
+class SlowAsyncResponse(FakeAsyncResponse):
+    async def read(self):
+        await asyncio.sleep(0.05)
+        return self.body
+
+
+def test_identical_concurrent_reads_share_one_request(joined):
+    session = GatedSession(joined, followers=7)
+    endpoint = Endpoint("indexes", session=session)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda _: endpoint.get(endpoint="hotels/stats"), range(8)))
+    assert len(session.calls) == 1
+    assert len({id(response) for response in responses}) == 8
+    assert all(response.content is responses[0].content for response in responses)
+
+
+def test_different_or_non_read_requests_are_not_coalesced():
+    session = GatedSession(parties=4)
+    endpoint = Endpoint("indexes", session=session)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        executor.submit(endpoint.get, endpoint="hotels/stats")
+        executor.submit(endpoint.get, endpoint="flights/stats")
+        executor.submit(endpoint.post, data={"value": []}, endpoint="hotels/docs/index")
+        executor.submit(endpoint.post, data={"value": []}, endpoint="hotels/docs/index")
+    assert len(session.calls) == 4
+
+
+def test_errors_are_shared_and_not_cached(joined):
+    flight = SingleFlight()
+    started = threading.Event()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        started.set()
+        assert joined.acquire(timeout=5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(flight.do, "key", failing)
+        started.wait()
+        follower = executor.submit(flight.do, "key", failing)
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+    assert len(calls) == 1
+    assert len(flight) == 0
+
+
+def test_identical_concurrent_async_searches_share_one_request():
+    session = SlowAsyncSession()
+    endpoint = AsyncEndpoint("indexes", session=session)
+
+    async def search():
+        return await endpoint.post(data={"search": "hotel"}, endpoint="hotels/docs/search",
+                                   idempotent=True, coalesce=True)
+
+    async def run():
+        return await asyncio.gather(*[search() for _ in range(10)])
+
+    responses = asyncio.run(run())
+    assert len(session.calls) == 1
+    assert len({id(response) for response in responses}) == 10
+    assert all(response.content is responses[0].content for response in responses)